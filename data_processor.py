@@ -1,16 +1,55 @@
+import numpy as np
 import pandas as pd
+import os
 import sqlite3
 from pathlib import Path
 import logging
+from contextlib import contextmanager
 from datetime import datetime
+from functools import lru_cache
+from importlib.util import find_spec
 import pytz
 from dateutil.parser import parse
-from typing import Optional, Dict, Any
-from schemas import TABLE_SCHEMAS, DATABASE_FILE, BATCH_SIZE
+from typing import Optional, Dict, Any, Iterator, Callable, Iterable, Union, BinaryIO
+from schemas import TABLE_SCHEMAS, DATABASE_FILE, BATCH_SIZE, SCHEMA_VERSION, SQLITE_PRAGMAS
+from utils import STRING_DTYPE, to_sql_values
+
+logger = logging.getLogger(__name__)
+
+try:
+    import ciso8601  # C parser for ISO 8601 strings, much faster than dateutil
+except ImportError:
+    ciso8601 = None
+
+@lru_cache(maxsize=64)
+def _tz(name: str):
+    """Return the pytz timezone for a name, constructing it only once"""
+    return pytz.timezone(name)
+
+# Lowercases ASCII letters and turns spaces into underscores in a single pass
+_NORM_TRANS = str.maketrans({' ': '_', **{chr(c): chr(c + 32) for c in range(ord('A'), ord('Z') + 1)}})
 
 def normalize_column_name(col: str) -> str:
     """Normalize column name for comparison"""
-    return str(col).lower().strip().replace(' ', '_')
+    name = str(col).strip()
+    if name.isascii():
+        return name.translate(_NORM_TRANS)
+    # str.lower handles non-ASCII letters the translation table does not cover
+    return name.lower().replace(' ', '_')
+
+# Normalized header sets per table, computed once since TABLE_SCHEMAS is static
+_TABLE_INDEX = [
+    (name,
+     frozenset(normalize_column_name(col) for col in schema["columns"]),
+     frozenset(normalize_column_name(col) for col in schema["renames"]))
+    for name, schema in TABLE_SCHEMAS.items()
+]
+# Normalized schema column name -> schema column name, in schema order
+_NORM_COL_MAP = {
+    name: {normalize_column_name(col): col for col in schema["columns"]}
+    for name, schema in TABLE_SCHEMAS.items()
+}
+_KEYLOG_REQUIRED_HEADERS = frozenset(normalize_column_name(h) for h in ('application', 'time', 'text'))
 
 def identify_table(df: pd.DataFrame) -> Optional[str]:
     """Identifies the table based on the file's headers with flexible matching."""
@@ -19,30 +58,26 @@ def identify_table(df: pd.DataFrame) -> Optional[str]:
     
     # Convert all headers to normalized form for comparison
     file_headers = {normalize_column_name(col) for col in df.columns if pd.notna(col)}
-    logging.info(f"Found headers in file (after cleaning): {list(df.columns)}")
-    logging.info(f"Normalized headers: {list(file_headers)}")
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        logger.debug("Found headers in file (after cleaning): %s", df.columns.tolist())
+        logger.debug("Normalized headers: %s", sorted(file_headers))
     
     # Early return if no valid headers
     if not file_headers:
-        logging.error("No valid headers found in the file")
+        logger.error("No valid headers found in the file")
         return None
     
-    for table, schema in TABLE_SCHEMAS.items():
-        schema_headers = {normalize_column_name(col) for col in schema["columns"]}
-        rename_headers = {normalize_column_name(col) for col in schema["renames"].keys()}
-        
-        logging.info(f"Checking table {table}")
-        logging.info(f"Schema headers: {schema_headers}")
-        logging.info(f"Rename headers: {rename_headers}")
+    for table, schema_headers, rename_headers in _TABLE_INDEX:
+        if debug:
+            logger.debug("Checking table %s (schema headers: %s, rename headers: %s)",
+                         table, sorted(schema_headers), sorted(rename_headers))
         
         # Special handling for Keylog tables with more flexible matching
         if table in ['KeylogImport', 'Keylogs']:
-            required_keylog_headers = {'application', 'time', 'text'}
-            normalized_required = {normalize_column_name(h) for h in required_keylog_headers}
-            
             # Check if required headers are present (allowing for partial matches)
-            if any(any(req in header for header in file_headers) for req in normalized_required):
-                logging.info(f"Matched {table} table based on required keylog headers")
+            if any(any(req in header for header in file_headers) for req in _KEYLOG_REQUIRED_HEADERS):
+                logger.info("Matched %s table based on required keylog headers", table)
                 return table
         
         # For other tables, use a more lenient matching approach
@@ -51,13 +86,20 @@ def identify_table(df: pd.DataFrame) -> Optional[str]:
         
         # Lower the threshold to 60% for more flexible matching
         if schema_match_ratio >= 0.6 or rename_match_ratio >= 0.6:
-            logging.info(f"Matched {table} table with match ratio: {max(schema_match_ratio, rename_match_ratio):.2f}")
+            logger.info("Matched %s table with match ratio: %.2f", table, max(schema_match_ratio, rename_match_ratio))
             return table
     
-    logging.error("No matching table schema found")
-    logging.error(f"Available headers: {list(df.columns)}")
+    logger.error("No matching table schema found")
+    logger.error("Available headers: %s", df.columns.tolist())
     return None
 
+def connect_db() -> sqlite3.Connection:
+    """Open the database with settings tuned for bulk inserts"""
+    conn = sqlite3.connect(DATABASE_FILE)
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
 def init_db():
     """Initializes the SQLite database and creates tables if they don't exist."""
     schema = """
@@ -110,37 +152,52 @@ def init_db():
     );
     """
     with sqlite3.connect(DATABASE_FILE) as conn:
+        # Skip the DDL entirely once this schema version has been applied
+        if conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+            return
         conn.executescript(schema)
-        logging.info("Database initialized successfully")
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        logger.info("Database initialized successfully")
 
-def parse_timestamp_flexible(date_str: str, timezone: str = "UTC") -> Optional[datetime]:
-    """Parse timestamp with flexible format handling"""
-    if pd.isna(date_str) or not date_str:
-        return None
-    
-    if isinstance(date_str, datetime):
-        return date_str
-    
+# Excel engines in order of preference. openpyxl keeps xlsx numbers exact (calamine reads them as
+# float64, which corrupts long phone numbers), so calamine (Rust) takes over from xlrd for legacy xls.
+# Engines whose package is missing are dropped up front instead of failing on every read.
+EXCEL_ENGINES = [
+    engine for engine, module in [('openpyxl', 'openpyxl'), ('calamine', 'python_calamine'), ('xlrd', 'xlrd')]
+    if find_spec(module)
+]
+# Engines limited to one family of formats; calamine reads both
+EXCEL_ENGINE_SUFFIXES = {'openpyxl': {'.xlsx', '.xlsm'}, 'xlrd': {'.xls'}}
+
+# Explicit formats tried when the generic parser cannot make sense of a value
+COMMON_DATE_FORMATS = [
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%Y-%m-%d',
+    '%d/%m/%Y %H:%M:%S',
+    '%d/%m/%Y %H:%M',
+    '%d/%m/%Y',
+]
+
+@lru_cache(maxsize=100_000)
+def _parse_cached(date_str: str, timezone: str) -> Optional[datetime]:
+    """Parse a stripped timestamp string, memoized since exports repeat timestamps heavily"""
     try:
-        if isinstance(date_str, str):
-            # Remove any extra whitespace
-            date_str = date_str.strip()
-            
+        dt = None
+        if ciso8601 is not None:
+            # Fast path for ISO formatted strings
+            try:
+                dt = ciso8601.parse_datetime(date_str)
+            except ValueError:
+                pass
+        
+        if dt is None:
             # Try parsing with dateutil parser
             try:
                 dt = parse(date_str)
             except ValueError:
                 # Try common formats if dateutil parser fails
-                common_formats = [
-                    '%Y-%m-%d %H:%M:%S',
-                    '%Y-%m-%d %H:%M',
-                    '%Y-%m-%d',
-                    '%d/%m/%Y %H:%M:%S',
-                    '%d/%m/%Y %H:%M',
-                    '%d/%m/%Y',
-                ]
-                
-                for fmt in common_formats:
+                for fmt in COMMON_DATE_FORMATS:
                     try:
                         dt = datetime.strptime(date_str, fmt)
                         break
@@ -148,17 +205,65 @@ def parse_timestamp_flexible(date_str: str, timezone: str = "UTC") -> Optional[d
                         continue
                 else:
                     raise ValueError(f"Could not parse date string: {date_str}")
-            
-            # Set timezone if not present
-            if dt.tzinfo is None:
-                dt = pytz.timezone(timezone).localize(dt)
-            return dt
         
-        return None
+        # Set timezone if not present
+        if dt.tzinfo is None:
+            dt = _tz(timezone).localize(dt)
+        return dt
     except Exception as e:
-        logging.error(f"Failed to parse timestamp '{date_str}': {e}")
+        logger.error(f"Failed to parse timestamp '{date_str}': {e}")
         return None
 
+def parse_upload_timestamp(date_str: str, timezone: str = "UTC") -> Optional[datetime]:
+    """Parse timestamp with flexible format handling"""
+    if pd.isna(date_str) or not date_str:
+        return None
+    
+    if isinstance(date_str, datetime):
+        return date_str
+    
+    if isinstance(date_str, str):
+        # Remove any extra whitespace
+        return _parse_cached(date_str.strip(), timezone)
+    
+    return None
+
+def _to_datetime(values: pd.Series, timezone: str, **kwargs) -> pd.Series:
+    """Run pd.to_datetime and make the result aware in the given timezone"""
+    parsed = pd.to_datetime(values, errors='coerce', utc=(timezone == "UTC"), **kwargs)
+    if not pd.api.types.is_datetime64_any_dtype(parsed):
+        raise TypeError("values resolved to mixed timezones")
+    if parsed.dt.tz is None:
+        return parsed.dt.tz_localize(timezone)
+    return parsed.dt.tz_convert(timezone)
+
+def parse_upload_timestamps(values: pd.Series, timezone: str = "UTC") -> pd.Series:
+    """Parse a timestamp column in bulk, falling back to per-row parsing only for leftovers"""
+    if pd.api.types.is_numeric_dtype(values):
+        # pd.to_datetime would read plain numbers as epoch offsets
+        return values.apply(parse_upload_timestamp, timezone=timezone)
+    
+    # Parse each distinct value once, then map the results back onto the column
+    uniques = pd.Series(values.dropna().unique())
+    try:
+        parsed = _to_datetime(uniques, timezone, format='mixed', cache=True)
+        
+        for fmt in COMMON_DATE_FORMATS:
+            pending = parsed.isna()
+            if not pending.any():
+                break
+            parsed = parsed.combine_first(_to_datetime(uniques[pending], timezone, format=fmt))
+        
+        pending = parsed.isna()
+        if pending.any():
+            residual = uniques[pending].apply(parse_upload_timestamp, timezone=timezone)
+            parsed = parsed.combine_first(_to_datetime(residual.dropna(), timezone))
+    except (TypeError, ValueError) as e:
+        logger.warning(f"Vectorized timestamp parsing failed, parsing row by row: {e}")
+        return values.apply(parse_upload_timestamp, timezone=timezone)
+    
+    return values.map(pd.Series(parsed.array, index=uniques.array))
+
 def validate_data(df: pd.DataFrame, table_name: str) -> pd.DataFrame:
     """Validates and cleans data according to schema"""
     schema = TABLE_SCHEMAS.get(table_name)
@@ -167,23 +272,19 @@ def validate_data(df: pd.DataFrame, table_name: str) -> pd.DataFrame:
     
     # Store original column names for reference
     original_columns = df.columns
-    logging.info(f"Original columns: {list(original_columns)}")
-    
-    # Create a mapping of normalized names to original names
-    norm_to_orig = {normalize_column_name(col): col for col in original_columns}
+    logger.info(f"Original columns: {list(original_columns)}")
     
-    # Map schema columns to actual columns
-    column_mapping = {}
-    for expected_col in schema["columns"]:
-        norm_expected = normalize_column_name(expected_col)
-        if norm_expected in norm_to_orig:
-            column_mapping[norm_to_orig[norm_expected]] = expected_col
+    # Normalize the headers in one vectorized pass (same rules as normalize_column_name)
+    norm_cols = _NORM_COL_MAP[table_name]
+    normalized = original_columns.astype(str).str.lower().str.strip().str.replace(' ', '_', regex=False)
+    # Keep schema columns only, and the last header when several normalize to the same name
+    keep_mask = normalized.isin(list(norm_cols)) & ~normalized.duplicated(keep='last')
     
-    if not column_mapping:
+    if not keep_mask.any():
         raise ValueError(f"No matching columns found in the data. Expected columns: {schema['columns']}")
     
-    # Select and rename columns
-    df = df[list(column_mapping.keys())].rename(columns=column_mapping)
+    # Select and rename columns positionally
+    df = df.loc[:, keep_mask].set_axis([norm_cols[name] for name in normalized[keep_mask]], axis=1)
     
     # Apply data type conversions and handle NULL constraints
     for col, dtype in zip(schema["columns"], schema["types"]):
@@ -191,13 +292,16 @@ def validate_data(df: pd.DataFrame, table_name: str) -> pd.DataFrame:
             try:
                 if dtype == datetime:
                     # Convert to datetime and handle invalid values
-                    df[col] = df[col].apply(parse_timestamp_flexible)
+                    df[col] = parse_upload_timestamps(df[col])
                     # Drop rows where required datetime fields are null
                     if col in ['time', 'last_contacted', 'install_date']:
                         df = df.dropna(subset=[col])
-                        logging.info(f"Dropped {len(df)} rows with null {col}")
+                        logger.info(f"Dropped {len(df)} rows with null {col}")
                 elif dtype == int:
-                    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
+                    # Coerce on the raw array so no intermediate Series are built; nan_to_num copies,
+                    # since to_numpy can hand back a view of the caller's frame
+                    values = pd.to_numeric(df[col].to_numpy(), errors='coerce')
+                    df[col] = np.nan_to_num(values, nan=0, posinf=0, neginf=0).astype(np.int64, copy=False)
                 else:
                     # Handle text fields, replace NaN with empty string for optional text fields
                     if col not in ['name', 'application', 'text']:  # Required text fields
@@ -205,15 +309,100 @@ def validate_data(df: pd.DataFrame, table_name: str) -> pd.DataFrame:
                     else:
                         # Drop rows where required text fields are null
                         df = df.dropna(subset=[col])
-                        logging.info(f"Dropped {len(df)} rows with null {col}")
+                        logger.info(f"Dropped {len(df)} rows with null {col}")
             except Exception as e:
-                logging.error(f"Error converting column {col}: {e}")
+                logger.error(f"Error converting column {col}: {e}")
                 raise ValueError(f"Failed to process column {col}: {e}")
     
     return df
 
-def process_and_insert_data(file_path: Path) -> Dict[str, Any]:
-    """Process and import data with statistics tracking"""
+@contextmanager
+def open_writer(table_name: str) -> Iterator[Callable[[pd.DataFrame], int]]:
+    """Yield a function inserting validated chunks into table_name within a single transaction"""
+    with connect_db() as conn:
+        conn.execute("BEGIN")
+
+        def write(chunk: pd.DataFrame) -> int:
+            # Insert data with a single prepared statement, slicing plain row tuples
+            # rather than building a DataFrame per batch
+            columns = list(chunk.columns)
+            sql = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+            records = list(to_sql_values(chunk).itertuples(index=False, name=None))
+            for i in range(0, len(records), BATCH_SIZE):
+                conn.executemany(sql, records[i:i + BATCH_SIZE])
+            return len(records)
+
+        yield write
+        conn.commit()
+
+def upload_csv_dtypes(columns: pd.Index, table_name: str) -> Dict[str, str]:
+    """Map CSV headers that normalize to a table's schema columns to read dtypes"""
+    schema = TABLE_SCHEMAS[table_name]
+    schema_types = {normalize_column_name(col): dtype for col, dtype in zip(schema["columns"], schema["types"])}
+    dtypes = {}
+    for col in columns:
+        dtype = schema_types.get(normalize_column_name(col))
+        # Integers are left to Arrow's inference since exports contain values like "35 Sec";
+        # timestamps stay text so validate_data can parse every format it supports
+        if dtype in (str, datetime):
+            dtypes[col] = STRING_DTYPE
+    return dtypes
+
+def read_csv_chunks(file_path: Path, columns: pd.Index, table_name: str) -> Iterator[pd.DataFrame]:
+    """Stream a CSV in BATCH_SIZE chunks, typing schema columns up front"""
+    # Memory-mapping lets the C parser read straight from the page cache instead of buffered reads
+    return pd.read_csv(file_path, chunksize=BATCH_SIZE, dtype=upload_csv_dtypes(columns, table_name), memory_map=True)
+
+# Exported workbooks open with a title row like "Tracking Smartphone ..." above the real header
+METADATA_HEADER_PREFIX = 'tracking smartphone'
+
+def has_metadata_header(columns: Iterable[Any]) -> bool:
+    """Check whether parsed column names are an export's title row rather than its header"""
+    # Plain prefix test that stops at the first match; no string Index or regex is built
+    return any(str(col).lower().startswith(METADATA_HEADER_PREFIX) for col in columns)
+
+def promote_header_row(df: pd.DataFrame) -> pd.DataFrame:
+    """Use a parsed sheet's first data row as its header, as parsing with header=1 would"""
+    header = df.iloc[0]
+    df = df.iloc[1:].reset_index(drop=True)
+    df.columns = [f"Unnamed: {i}" if pd.isna(name) else name for i, name in enumerate(header)]
+    # The header cells kept every column at object dtype, so let the remaining values decide
+    return df.infer_objects()
+
+def read_excel_file(file_path: Union[Path, BinaryIO], nrows: Optional[int] = None) -> pd.DataFrame:
+    """Read an Excel file, trying the preferred available engine for its format first"""
+    last_error = None
+    # Uploads are read from memory, so the format comes from the stream's name when there is no path
+    name = file_path if isinstance(file_path, (str, os.PathLike)) else getattr(file_path, 'name', '')
+    suffix = Path(name).suffix.lower()
+    for engine in EXCEL_ENGINES:
+        if suffix and engine in EXCEL_ENGINE_SUFFIXES and suffix not in EXCEL_ENGINE_SUFFIXES[engine]:
+            continue
+        try:
+            if hasattr(file_path, 'seek'):
+                # A failed attempt may have left an in-memory file part way through
+                file_path.seek(0)
+            # One extra row covers the real header line when the first row turns out to be metadata
+            df = pd.read_excel(file_path, engine=engine, nrows=None if nrows is None else nrows + 1)
+            # Check if first row contains metadata about tracking
+            if has_metadata_header(df.columns):
+                logger.info("Detected metadata row, using the next row as the header")
+                df = promote_header_row(df)
+            elif nrows is not None:
+                df = df.head(nrows)
+            logger.info(f"Successfully read Excel file with {engine} engine, headers: {list(df.columns)}")
+            return df
+        except Exception as e:
+            logger.warning(f"Failed to read with {engine}: {e}")
+            last_error = e
+    
+    if last_error is None:
+        raise ImportError("No Excel engine installed; install python-calamine, openpyxl or xlrd")
+    logger.error(f"Failed to read Excel file with any engine: {last_error}")
+    raise last_error
+
+def process_and_insert_data(file_path: Path, df: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
+    """Process and import data with statistics tracking, optionally from an already-read workbook"""
     stats = {
         "total_rows": 0,
         "processed_rows": 0,
@@ -222,56 +411,39 @@ def process_and_insert_data(file_path: Path) -> Dict[str, Any]:
     }
     
     try:
-        logging.info(f"Processing file: {file_path}")
+        logger.info(f"Processing file: {file_path}")
         
-        # Read the file
+        # Identify the table, then stream the file through validation in BATCH_SIZE chunks
         if file_path.suffix.lower() == '.csv':
-            df = pd.read_csv(file_path)
-            logging.info("Successfully read CSV file")
+            header = pd.read_csv(file_path, nrows=0)
+            table_name = identify_table(header)
+            chunks = read_csv_chunks(file_path, header.columns, table_name) if table_name else iter(())
         else:
-            # First attempt to read without skipping rows
-            try:
-                df = pd.read_excel(file_path, engine='openpyxl')
-                # Check if first row contains metadata about tracking
-                if any(col.lower().startswith('tracking smartphone') for col in df.columns.astype(str)):
-                    logging.info("Detected metadata row, reading file again with header row 1")
-                    df = pd.read_excel(file_path, engine='openpyxl', header=1)
-                logging.info(f"Successfully read Excel file with headers: {list(df.columns)}")
-            except Exception as e:
-                logging.warning(f"Failed to read with openpyxl: {e}")
-                try:
-                    df = pd.read_excel(file_path, engine='xlrd')
-                    if any(col.lower().startswith('tracking smartphone') for col in df.columns.astype(str)):
-                        df = pd.read_excel(file_path, engine='xlrd', header=1)
-                    logging.info(f"Successfully read Excel file with xlrd engine")
-                except Exception as e:
-                    logging.error(f"Failed to read Excel file with both engines: {e}")
-                    raise
-        
-        stats["total_rows"] = len(df)
+            # Excel workbooks are parsed in one go, so they are validated as a single chunk
+            if df is None:
+                df = read_excel_file(file_path)
+            table_name = identify_table(df)
+            chunks = [df]
         
-        # Identify table
-        table_name = identify_table(df)
         if not table_name:
             raise ValueError("Could not identify table schema. Please check the file headers.")
         
         stats["table_name"] = table_name
         
-        # Process data
-        df = validate_data(df, table_name)
-        
-        # Insert data
-        with sqlite3.connect(DATABASE_FILE) as conn:
-            for i in range(0, len(df), BATCH_SIZE):
-                batch = df.iloc[i:i + BATCH_SIZE]
-                batch.to_sql(table_name, conn, if_exists='append', index=False)
-                stats["processed_rows"] += len(batch)
+        with open_writer(table_name) as write:
+            for chunk in chunks:
+                stats["total_rows"] += len(chunk)
+                
+                # Process data
+                chunk = validate_data(chunk, table_name)
+                
+                stats["processed_rows"] += write(chunk)
         
         return stats
         
     except Exception as e:
         stats["failed_rows"] = stats["total_rows"] - stats["processed_rows"]
-        logging.error(f"Error processing file: {e}")
+        logger.error(f"Error processing file: {e}")
         raise
 
 def main():
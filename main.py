@@ -1,11 +1,27 @@
 import streamlit as st
 import pandas as pd
-import os
+import pyarrow as pa
+import pyarrow.compute as pc
+import hashlib
+import shutil
+import tempfile
+import time
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from data_processor import process_and_insert_data
+from data_processor import process_and_insert_data, identify_table, read_excel_file, init_db
 from utils import validate_file_type, read_file_sample, sanitize_dataframe
-from tables import identify_table
+from schemas import DATABASE_FILE
 import sqlite3
+from typing import Any, BinaryIO, Dict, Optional, Tuple, Union
+from streamlit.runtime.uploaded_file_manager import UploadedFile
+
+try:
+    import polars as pl  # Multi-threaded Arrow CSV reader, used for the preview when installed
+except ImportError:
+    pl = None
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 st.set_page_config(
     page_title="Data Import Tool",
@@ -13,112 +29,399 @@ st.set_page_config(
     initial_sidebar_state="collapsed"  # Better for mobile
 )
 
-# Enhanced mobile-first CSS
-st.markdown("""
-    <style>
-        /* Mobile-optimized button styles */
-        .stButton > button {
-            width: 100%;
-            min-height: 3.5rem;
-            margin: 0.75rem 0;
-            border-radius: 10px;
-            font-size: 1.1rem;
-            touch-action: manipulation;
-        }
-        
-        /* Container spacing for mobile */
-        .block-container {
-            padding: 1.5rem 1rem;
-            max-width: 100%;
-        }
-        
-        /* Enhanced table display for mobile */
-        .stDataFrame {
-            overflow-x: auto;
-            -webkit-overflow-scrolling: touch;
-            margin: 1rem -1rem;
-            padding: 0 1rem;
-        }
-        
-        /* Mobile-friendly spacing and text */
-        .element-container {
-            margin-bottom: 1.5rem;
-        }
-        
-        /* Improve readability on mobile */
-        .streamlit-expanderHeader {
-            font-size: 1.1rem;
-            padding: 1rem 0.75rem;
-        }
-        
-        /* Better touch targets */
-        .streamlit-expanderContent {
-            padding: 1rem;
-        }
-        
-        /* Enhanced mobile metrics display */
-        [data-testid="stMetricValue"] {
-            font-size: 1.5rem !important;
-        }
-        
-        /* Mobile-optimized headers */
-        h1, h2, h3 {
-            margin: 1rem 0;
-            line-height: 1.4;
-        }
-        
-        /* Improve form elements for touch */
-        .stSelectbox, .stTextInput {
-            margin: 1rem 0;
-        }
-        
-        /* Better error message display */
-        .stAlert {
-            padding: 1rem;
-            border-radius: 10px;
-            margin: 1rem 0;
-        }
-        
-        /* Loading indicator optimization */
-        .stProgress > div > div {
-            height: 10px;
-            border-radius: 5px;
-        }
-        
-        /* Responsive images */
-        img {
-            max-width: 100%;
-            height: auto;
-        }
-        
-        /* Mobile-friendly JSON display */
-        .json-object {
-            font-size: 0.9rem;
-            padding: 0.75rem;
-            border-radius: 8px;
-            overflow-x: auto;
-        }
-    </style>
-""", unsafe_allow_html=True)
+# Enhanced mobile-first CSS, read from disk once per process but sent on every run so it stays applied
+@st.cache_resource
+def load_css() -> str:
+    """Read the app stylesheet"""
+    return (Path(__file__).parent / 'static' / 'style.css').read_text()
+
+st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
+
+# Block size for copying uploads to disk, matched by the file's write buffer
+COPY_BLOCK_SIZE = 1 << 20
+# Saved uploads are named with this prefix so ones left behind by a killed run can be found again
+UPLOAD_PREFIX = "data-upload-"
+STALE_UPLOAD_SECONDS = 24 * 60 * 60
 
 def save_uploaded_file(uploaded_file):
-    """Save uploaded file to temp location"""
+    """Save uploaded file to a unique temp location"""
     try:
-        # Create a temporary file path
-        temp_dir = Path("temp")
-        temp_dir.mkdir(exist_ok=True)
-        temp_path = temp_dir / uploaded_file.name
-        
-        # Save uploaded file
-        with open(temp_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        return str(temp_path)
+        # A unique name per save keeps concurrent sessions uploading the same filename apart;
+        # the suffix is kept because readers pick CSV or Excel handling from it
+        uploaded_file.seek(0)
+        with tempfile.NamedTemporaryFile(
+            "wb", buffering=COPY_BLOCK_SIZE, prefix=UPLOAD_PREFIX, suffix=Path(uploaded_file.name).suffix, delete=False
+        ) as f:
+            # Stream the upload to disk in blocks rather than as one bytes object
+            shutil.copyfileobj(uploaded_file, f, length=COPY_BLOCK_SIZE)
+        return f.name
     except Exception as e:
         st.error(f"Error saving file: {e}")
         return None
 
+# How often the script thread checks on a running import
+IMPORT_POLL_SECONDS = 0.1
+
+@st.cache_resource
+def import_executor() -> ThreadPoolExecutor:
+    """Worker threads that run imports off the script thread, shared by all sessions"""
+    # Each import writes in its own transaction, so a couple of workers are plenty for SQLite
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="import")
+
+def remove_when_done(job: Optional[Future], path: Path) -> None:
+    """Delete a saved upload now, or once its import finishes if it is still running"""
+    if job is None or job.done():
+        path.unlink(missing_ok=True)
+    else:
+        job.add_done_callback(lambda _: path.unlink(missing_ok=True))
+
+@st.cache_resource
+def sweep_stale_uploads() -> int:
+    """Delete saved uploads a previous server process left in the temp directory, once per process"""
+    # Imports finish in seconds, so a day-old file is never one a live session is still reading
+    cutoff = time.time() - STALE_UPLOAD_SECONDS
+    removed = 0
+    for path in Path(tempfile.gettempdir()).glob(f"{UPLOAD_PREFIX}*"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except OSError:
+            continue
+    if removed:
+        logging.info(f"Removed {removed} stale uploads from the temp directory")
+    return removed
+
+def read_preview(source: Union[Path, BinaryIO], nrows: Optional[int] = None) -> pd.DataFrame:
+    """Read a CSV for the preview from a path or an in-memory upload, optionally only its first nrows rows"""
+    if pl is not None:
+        # Only the parsed result crosses over to pandas, the parsing itself runs in Rust.
+        # The streaming engine parses in batches, so no second full-size buffer is held.
+        lf = pl.scan_csv(source, infer_schema_length=None)
+        if nrows is not None:
+            lf = lf.head(nrows)
+        return lf.collect(engine="streaming").to_pandas(use_pyarrow_extension_array=True)
+    # Columns come back Arrow-backed, so the overview's later Arrow conversion has nothing left to do
+    if nrows is None:
+        # The pyarrow engine parses with multiple threads but cannot stop after nrows
+        return pd.read_csv(source, engine='pyarrow', dtype_backend='pyarrow')
+    # Only files on disk can be memory-mapped
+    return pd.read_csv(source, nrows=nrows, memory_map=isinstance(source, Path), dtype_backend='pyarrow')
+
+# sys.getsizeof('') on CPython, the fixed cost of each ASCII str object
+STR_OBJECT_OVERHEAD = 49
+
+def column_stats(df: pd.DataFrame) -> pd.DataFrame:
+    """Collect per-column null and distinct counts and approximate sizes in a single pass over the columns"""
+    rows = []
+    for _, series in df.items():
+        # Arrow columns report their real buffer sizes; object columns only count their pointers here
+        size = int(series.memory_usage(index=False))
+        # Arrow-backed columns carry a stored null count and are counted by Arrow's
+        # hash kernel, so no mask or intermediate unique array is built for them
+        if isinstance(series.dtype, pd.ArrowDtype):
+            values = pa.array(series.array)
+            nulls, unique = values.null_count, pc.count_distinct(values).as_py()
+        else:
+            nulls, unique = int(series.isnull().sum()), series.nunique()
+            # Text left in object columns is added back from vectorized string lengths plus a str header
+            # per cell, rather than walking every Python object as memory_usage(deep=True) does
+            if series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) == 'string':
+                size += int(series.str.len().sum()) + STR_OBJECT_OVERHEAD * (len(series) - nulls)
+        rows.append((nulls, unique, size))
+    return pd.DataFrame(rows, index=df.columns, columns=['nulls', 'unique', 'bytes'], dtype='int64')
+
+def column_min_max(series: pd.Series) -> Tuple[Any, Any]:
+    """Return a column's (min, max), in one Arrow kernel call where the column is Arrow-backed"""
+    if isinstance(series.dtype, pd.ArrowDtype):
+        bounds = pc.min_max(pa.array(series.array))
+        return bounds['min'].as_py(), bounds['max'].as_py()
+    return series.min(), series.max()
+
+@st.cache_resource(show_spinner=False)
+def ensure_database() -> bool:
+    """Create the database tables once per server process rather than on every rerun"""
+    init_db()
+    return True
+
+@st.cache_data(show_spinner=False)
+def existing_package_names() -> pd.Series:
+    """Load the package names already in InstalledApps, cached until the next import"""
+    with sqlite3.connect(DATABASE_FILE) as conn:
+        return pd.read_sql_query("SELECT package_name FROM InstalledApps", conn)['package_name']
+
+# Rows of the parsed upload shown in the preview tab
+PREVIEW_ROWS = 10
+
+# Uploads larger than this, and workbooks with more rows than OVERVIEW_SAMPLE_ROWS,
+# get their overview computed from the first OVERVIEW_SAMPLE_ROWS rows
+OVERVIEW_FULL_SCAN_BYTES = 50 * 1024 * 1024
+OVERVIEW_SAMPLE_ROWS = 20_000
+
+# Fields of the shared column info table shown in Column Analysis; the cards use Missing (%)
+COLUMN_ANALYSIS_FIELDS = ['Column', 'Type', 'Non-Null Count', 'Null Count', 'Unique Values']
+
+def upload_digest(uploaded_file: UploadedFile) -> bytes:
+    """Hash an upload's contents for the preview cache key, once per upload"""
+    # file_id is unique per upload, so reruns reuse the digest instead of re-hashing the whole file
+    cached = st.session_state.get("upload_digest")
+    if cached is None or cached[0] != uploaded_file.file_id:
+        # file_digest hashes the in-memory buffer directly in OpenSSL, using SHA extensions where the CPU has them
+        cached = (uploaded_file.file_id, hashlib.file_digest(uploaded_file, "sha256").digest())
+        st.session_state["upload_digest"] = cached
+    return cached[1]
+
+def is_csv(filename: str) -> bool:
+    """Check whether an upload is a CSV rather than an Excel workbook"""
+    return Path(filename).suffix.lower() == '.csv'
+
+@st.cache_data(show_spinner=False, max_entries=4, hash_funcs={UploadedFile: upload_digest})
+def read_excel_upload(uploaded_file: UploadedFile) -> pd.DataFrame:
+    """Parse an uploaded workbook once per upload, shared by the overview and the import"""
+    # The header row detection in read_excel_file runs here too, so the import reuses its result
+    # The upload is already an in-memory stream, so it is parsed in place rather than copied out first
+    uploaded_file.seek(0)
+    return read_excel_file(uploaded_file)
+
+@st.cache_data(show_spinner=False, max_entries=8, hash_funcs={UploadedFile: upload_digest})
+def build_preview(uploaded_file: UploadedFile) -> Tuple[Union[pa.Table, pd.DataFrame], Dict[str, Any]]:
+    """Parse an upload and compute its overview, cached on the file contents across reruns"""
+    # The full parse of a large upload is left to the importer
+    sample_rows = OVERVIEW_SAMPLE_ROWS if uploaded_file.size > OVERVIEW_FULL_SCAN_BYTES else None
+    if is_csv(uploaded_file.name):
+        # The upload is already in memory, so it is parsed in place rather than saved to disk first
+        uploaded_file.seek(0)
+        df = read_preview(uploaded_file, nrows=sample_rows)
+        sampled = sample_rows is not None and len(df) == sample_rows
+    elif sample_rows is not None:
+        # Only the leading rows are converted; the import parses the whole sheet if the user goes ahead
+        uploaded_file.seek(0)
+        df = read_excel_file(uploaded_file, nrows=sample_rows)
+        sampled = len(df) == sample_rows
+    else:
+        df = read_excel_upload(uploaded_file)
+        # The whole sheet is parsed for the import anyway, but cleaning and profiling it need not be
+        sampled = len(df) > OVERVIEW_SAMPLE_ROWS
+        if sampled:
+            # Re-infer dtypes so the slice's object columns hold strings only, as a short read would
+            df = df.head(OVERVIEW_SAMPLE_ROWS).infer_objects()
+    df = sanitize_dataframe(df)
+    
+    # Arrow-backed columns keep strings in contiguous buffers, so the size and null
+    # counts below are computed by Arrow kernels rather than by walking Python objects
+    df = df.convert_dtypes(dtype_backend="pyarrow")
+    # Narrow integer columns to the smallest type holding their values, shrinking every scan below;
+    # floats are left alone since float32 would show rounded values in the preview
+    int_cols = [col for col, dtype in df.dtypes.items() if pd.api.types.is_integer_dtype(dtype)]
+    if int_cols:
+        df[int_cols] = df[int_cols].apply(pd.to_numeric, downcast='integer')
+    # One pass over the columns feeds every missing/completeness/distinct figure on the page
+    per_column = column_stats(df)
+    null_counts = per_column['nulls']
+    n_rows, n_cols = df.shape
+    non_null_counts = n_rows - null_counts
+    missing = int(null_counts.sum())
+    # Both the column analysis and the Column Info cards show the dtype names
+    dtype_names = df.dtypes.astype(str).to_numpy()
+    # Read the dtypes directly instead of building a select_dtypes sub-frame just for its column names
+    date_cols = [col for col, dtype in df.dtypes.items() if pd.api.types.is_datetime64_any_dtype(dtype)]
+    stats = {
+        "sampled": sampled,
+        "rows": n_rows,
+        "columns": n_cols,
+        "missing": missing,
+        # Only a boolean mask is allocated, not a deduplicated copy of the frame
+        "duplicates": int(df.duplicated().sum()),
+        # Every column has n_rows cells, so the mean per-column completeness is the overall non-null share
+        "completeness": (1 - missing / (n_rows * n_cols)) * 100 if n_rows * n_cols else float('nan'),
+        "size": int(per_column['bytes'].sum()),
+        # One Arrow table feeds both the Column Analysis table and the Column Info cards; names and dtype
+        # objects are rendered as text so mixed-type headers (e.g. ints and strings from a sheet) serialize,
+        # and the counts come from the fused pass above in column order, so plain arrays skip index alignment
+        "column_info": pa.Table.from_pandas(pd.DataFrame({
+            'Column': df.columns.astype(str),
+            'Type': dtype_names,
+            'Non-Null Count': non_null_counts.to_numpy(),
+            'Null Count': null_counts.to_numpy(),
+            'Unique Values': per_column['unique'].to_numpy(),
+            'Missing (%)': (null_counts / n_rows * 100).round(1).to_numpy(),
+        }), preserve_index=False),
+        "date_ranges": {col: column_min_max(df[col]) for col in date_cols},
+    }
+    head = df.head(PREVIEW_ROWS)
+    try:
+        # Streamlit renders Arrow tables as-is, so the cached rows skip a pandas-to-Arrow hop per rerun
+        head = pa.Table.from_pandas(head, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed-type object columns are left for st.dataframe to stringify
+        pass
+    return head, stats
+
+@st.cache_data(show_spinner=False, max_entries=8, hash_funcs={UploadedFile: upload_digest})
+def import_summary(uploaded_file: UploadedFile) -> Tuple[Optional[str], int, Optional[pd.Series]]:
+    """Identify an upload's table and count its rows, with its package names when it holds InstalledApps"""
+    if is_csv(uploaded_file.name):
+        uploaded_file.seek(0)
+        header = pd.read_csv(uploaded_file, nrows=0)
+        table_name = identify_table(header)
+        # Only one column is parsed: the package names where the duplicate check needs them,
+        # otherwise the first column, which is enough to count the rows
+        column = 'Package Name' if 'Package Name' in header.columns else header.columns[0]
+        uploaded_file.seek(0)
+        values = pd.read_csv(uploaded_file, usecols=[column], engine='pyarrow')[column]
+        rows = len(values)
+    else:
+        # The workbook is parsed for the import anyway, and this parse is the one the import reuses
+        df = read_excel_upload(uploaded_file)
+        table_name = identify_table(df)
+        values = df['Package Name'] if 'Package Name' in df.columns else None
+        rows = len(df.dropna(how='all'))
+    return table_name, rows, values if table_name == "InstalledApps" else None
+
+def show_import_preview(uploaded_file: UploadedFile) -> None:
+    """Report how many rows the import will add, warning about packages that are already stored"""
+    try:
+        table_name, new_entries_count, package_names = import_summary(uploaded_file)
+    except Exception:
+        # The import reports why the file could not be read
+        return
+    duplicates_message = ""
+
+    if table_name == "InstalledApps" and package_names is not None:
+        # Connect to database and check for existing records
+        existing_packages = existing_package_names()
+        if not existing_packages.empty:
+            # Count how many records are new (not in database)
+            rows = new_entries_count
+            new_entries_count = int((~package_names.isin(existing_packages)).sum())
+            duplicates_count = rows - new_entries_count
+            if duplicates_count > 0:
+                duplicates_message = f"⚠️ {duplicates_count} duplicate entries found and will be skipped."
+
+    # Display import preview
+    st.write("### Import Preview")
+    if new_entries_count > 0:
+        st.success(f"✅ {new_entries_count} new entries will be added to the database.")
+        if duplicates_message:
+            st.warning(duplicates_message)
+    else:
+        st.warning("⚠️ All entries already exist in the database. No new data will be imported.")
+
+def session_preview(uploaded_file: UploadedFile) -> Tuple[Union[pa.Table, pd.DataFrame], Dict[str, Any]]:
+    """Return build_preview's result, kept in session state so reruns for the same upload skip re-hashing it"""
+    # file_id is unique per upload, so the full-content digest behind the cache key is only computed once
+    cached = st.session_state.get("preview")
+    if cached is None or cached[0] != uploaded_file.file_id:
+        st.session_state["preview"] = (uploaded_file.file_id, build_preview(uploaded_file))
+        cached = st.session_state["preview"]
+    return cached[1]
+
+def cleaned_preview(uploaded_file: UploadedFile) -> Union[pa.Table, pd.DataFrame]:
+    """Return the sanitized first rows shown before an import, kept in session state per upload"""
+    # An overview built earlier for this upload already holds sanitized rows, even if it is toggled off now
+    overview = st.session_state.get("preview")
+    if overview is not None and overview[0] == uploaded_file.file_id:
+        return overview[1][0]
+    cached = st.session_state.get("cleaned_preview")
+    if cached is None or cached[0] != uploaded_file.file_id:
+        # Without the overview only the rows shown here are parsed
+        if is_csv(uploaded_file.name):
+            uploaded_file.seek(0)
+            rows = read_preview(uploaded_file, nrows=PREVIEW_ROWS)
+        else:
+            # Re-infer dtypes so the head's object columns hold strings only, as a short read would
+            rows = read_excel_upload(uploaded_file).head(PREVIEW_ROWS).infer_objects()
+        cached = (uploaded_file.file_id, sanitize_dataframe(rows))
+        st.session_state["cleaned_preview"] = cached
+    return cached[1]
+
+@st.fragment
+def show_overview(uploaded_file: UploadedFile) -> None:
+    """Render the optional dataset overview; as a fragment, toggling it reruns only this section"""
+    # The overview parses far more than the preview rows, so it is only built once the user asks for it
+    if st.toggle(
+        "📊 Show dataset overview",
+        key="show_overview",
+        help=(
+            "Parses the file to check duplicates, missing values and column statistics; "
+            f"large files are profiled from their first {OVERVIEW_SAMPLE_ROWS:,} rows"
+        )
+    ):
+        try:
+            df_preview, stats = session_preview(uploaded_file)
+        except Exception as e:
+            st.error(f"Failed to read file: {str(e)}")
+            return
+        
+        if stats["sampled"]:
+            st.info(f"ℹ️ Large file: the overview below covers the first {OVERVIEW_SAMPLE_ROWS:,} rows only.")
+        
+        # Basic Statistics
+        st.write("### Data Analysis")
+    
+        # Data Quality Metrics
+        st.write("#### Data Quality Overview")
+        # Use 2 columns for better mobile layout
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Total Rows", stats["rows"])
+        with col2:
+            st.metric("Data Completeness", f"{stats['completeness']:.1f}%")
+        # The secondary figures go out as a single markdown table rather than one element each
+        st.markdown(
+            "| Metric | Value |\n| --- | --- |\n"
+            f"| Total Columns | {stats['columns']} |\n"
+            f"| Missing Values | {stats['missing']} |\n"
+            f"| Duplicate Rows | {stats['duplicates']} |\n"
+            f"| Size (approx) | {stats['size'] / 1024:.1f} KB |"
+        )
+    
+        # Column Analysis
+        st.write("#### Column Analysis")
+        st.dataframe(stats["column_info"], use_container_width=True, column_order=COLUMN_ANALYSIS_FIELDS)
+    
+        # Date columns analysis
+        date_ranges = stats["date_ranges"]
+        if date_ranges:
+            st.write("#### Timestamp Analysis")
+            st.write("Detected timestamp columns:", ", ".join(date_ranges))
+            for col, (min_date, max_date) in date_ranges.items():
+                st.write(f"**{col} - Date Range:**")
+                st.write(f"From: {min_date}")
+                st.write(f"To: {max_date}")
+    
+        # Enhanced mobile-friendly data preview
+        with st.expander("📊 Data Preview", expanded=False):
+            # Tab-based navigation for better mobile experience
+            preview_tab, stats_tab = st.tabs(["Preview Data", "Column Info"])
+        
+            with preview_tab:
+                # Show simplified preview for mobile
+                preview_height = 250 if stats["columns"] > 4 else 400
+                st.dataframe(
+                    df_preview,  # Show fewer rows for better mobile view
+                    use_container_width=True,
+                    height=preview_height
+                )
+            
+                # Add swipe hint for mobile
+                st.caption("👈 Swipe left/right to view all columns")
+        
+            with stats_tab:
+                # Display stats in a mobile-friendly format, all cards in a single markdown element
+                st.markdown("".join(f"""
+                    <div style='padding: 0.5rem; background-color: #f0f2f6; border-radius: 8px; margin-bottom: 0.5rem;'>
+                        <strong>{row['Column']}</strong><br/>
+                        Type: {row['Type']}<br/>
+                        Missing: {row['Missing (%)']}%
+                    </div>
+                """ for row in stats["column_info"].select(['Column', 'Type', 'Missing (%)']).to_pylist()),
+                    unsafe_allow_html=True)
+
 def main():
     st.title("Data Import Tool")
+    ensure_database()
+    sweep_stale_uploads()
     
     # Initialize session state
     if 'upload_state' not in st.session_state:
@@ -144,156 +447,23 @@ def main():
 
             # Preview data with error handling and duplicate checking
             try:
-                if uploaded_file.type == "text/csv":
-                    df_preview = pd.read_csv(uploaded_file)
-                elif any(uploaded_file.name.lower().endswith(ext) for ext in ['.xlsx', '.xls']):
-                    # Save the file temporarily
-                    temp_path = Path("temp") / uploaded_file.name
-                    temp_path.parent.mkdir(exist_ok=True)
-                    
-                    with open(temp_path, "wb") as f:
-                        f.write(uploaded_file.getbuffer())
-                    
-                    try:
-                        # Read Excel file treating first row as column names
-                        df_preview = pd.read_excel(
-                            temp_path,
-                            engine='openpyxl' if uploaded_file.name.lower().endswith('.xlsx') else 'xlrd',
-                            header=0  # Explicitly set to use first row as headers
-                        )
-                        
-                        # If the first row contains metadata about tracking smartphone
-                        if not df_preview.empty and any(df_preview.columns.astype(str).str.contains('Tracking Smartphone', case=False, na=False)):
-                            # Read again with the second row as headers
-                            df_preview = pd.read_excel(
-                                temp_path,
-                                engine='openpyxl' if uploaded_file.name.lower().endswith('.xlsx') else 'xlrd',
-                                header=1  # Use second row as headers since first row is metadata
-                            )
-                    except Exception as e:
-                        st.error(f"Failed to read Excel file: {str(e)}")
-                        return
-                    finally:
-                        # Clean up temp file
-                        if temp_path.exists():
-                            temp_path.unlink()
-                else:
+                if not any(uploaded_file.name.lower().endswith(ext) for ext in ['.csv', '.xlsx', '.xls']):
                     st.error("Unsupported file type")
                     return
                 
-                # Clean the preview data
-                df_preview = sanitize_dataframe(df_preview)
-                
-                # Identify table type and check for duplicates
-                table_name = identify_table(df_preview)
-                new_entries_count = len(df_preview)
-                duplicates_message = ""
-                
-                if table_name == "InstalledApps":
-                    # Connect to database and check for existing records
-                    with sqlite3.connect("data.db") as conn:
-                        existing_packages = pd.read_sql_query("SELECT package_name FROM InstalledApps", conn)
-                        if not existing_packages.empty:
-                            # Count how many records are new (not in database)
-                            new_records = df_preview[~df_preview['Package Name'].isin(existing_packages['package_name'])]
-                            new_entries_count = len(new_records)
-                            duplicates_count = len(df_preview) - new_entries_count
-                            if duplicates_count > 0:
-                                duplicates_message = f"⚠️ {duplicates_count} duplicate entries found and will be skipped."
+                # The duplicate check is cheap, so it runs whether or not the overview is shown
+                show_import_preview(uploaded_file)
+                show_overview(uploaded_file)
                 
-                # Display import preview
-                st.write("### Import Preview")
-                if new_entries_count > 0:
-                    st.success(f"✅ {new_entries_count} new entries will be added to the database.")
-                    if duplicates_message:
-                        st.warning(duplicates_message)
-                else:
-                    st.warning("⚠️ All entries already exist in the database. No new data will be imported.")
-                    
-                # Basic Statistics
-                st.write("### Data Analysis")
-                
-                # Data Quality Metrics
-                st.write("#### Data Quality Overview")
-                # Use 2 columns for better mobile layout
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.metric("Total Rows", len(df_preview))
-                    st.metric("Total Columns", len(df_preview.columns))
-                    st.metric("Missing Values", df_preview.isnull().sum().sum())
-                with col2:
-                    st.metric("Duplicate Rows", len(df_preview) - len(df_preview.drop_duplicates()))
-                    non_null_counts = df_preview.count()
-                    completeness = (non_null_counts / len(df_preview)).mean() * 100
-                    st.metric("Data Completeness", f"{completeness:.1f}%")
-                    st.metric("Size", f"{df_preview.memory_usage(deep=True).sum() / 1024:.1f} KB")
-                
-                # Column Analysis
-                st.write("#### Column Analysis")
-                column_analysis = pd.DataFrame({
-                    'Column': df_preview.columns,
-                    'Type': df_preview.dtypes,
-                    'Non-Null Count': df_preview.count(),
-                    'Null Count': df_preview.isnull().sum(),
-                    'Unique Values': df_preview.nunique(),
-                })
-                st.dataframe(column_analysis, use_container_width=True)
-                
-                # Date columns analysis
-                date_cols = df_preview.select_dtypes(include=['datetime64']).columns
-                if len(date_cols) > 0:
-                    st.write("#### Timestamp Analysis")
-                    st.write("Detected timestamp columns:", ", ".join(date_cols))
-                    for col in date_cols:
-                        st.write(f"**{col} - Date Range:**")
-                        min_date = df_preview[col].min()
-                        max_date = df_preview[col].max()
-                        st.write(f"From: {min_date}")
-                        st.write(f"To: {max_date}")
+                # Reuse the overview's rows when it was built
+                df_preview = None
+                if st.session_state.get("show_overview"):
+                    try:
+                        df_preview, _ = session_preview(uploaded_file)
+                    except Exception:
+                        # The overview has already reported why the file could not be read
+                        return
                 
-                # Enhanced mobile-friendly data preview
-                with st.expander("📊 Data Preview", expanded=True):
-                    # Tab-based navigation for better mobile experience
-                    preview_tab, stats_tab = st.tabs(["Preview Data", "Column Info"])
-                    
-                    with preview_tab:
-                        # Compact preview with horizontal scroll
-                        st.markdown("""
-                            <style>
-                                .preview-container { overflow-x: auto; -webkit-overflow-scrolling: touch; }
-                            </style>
-                        """, unsafe_allow_html=True)
-                        
-                        # Show simplified preview for mobile
-                        preview_height = 250 if len(df_preview.columns) > 4 else 400
-                        st.dataframe(
-                            df_preview.head(10),  # Show fewer rows for better mobile view
-                            use_container_width=True,
-                            height=preview_height
-                        )
-                        
-                        # Add swipe hint for mobile
-                        st.caption("👈 Swipe left/right to view all columns")
-                    
-                    with stats_tab:
-                        # Enhanced column information display
-                        col_info = pd.DataFrame({
-                            'Column': df_preview.columns,
-                            'Type': df_preview.dtypes.astype(str),
-                            'Missing (%)': (df_preview.isnull().sum() / len(df_preview) * 100).round(1)
-                        })
-                        
-                        # Display stats in a mobile-friendly format
-                        for _, row in col_info.iterrows():
-                            with st.container():
-                                st.markdown(f"""
-                                    <div style='padding: 0.5rem; background-color: #f0f2f6; border-radius: 8px; margin-bottom: 0.5rem;'>
-                                        <strong>{row['Column']}</strong><br/>
-                                        Type: {row['Type']}<br/>
-                                        Missing: {row['Missing (%)']}%
-                                    </div>
-                                """, unsafe_allow_html=True)
-
                 # Process button
                 if st.button("Process and Import Data", key='process_button'):
                     st.session_state.upload_state = True
@@ -303,42 +473,39 @@ def main():
                     status_container = st.empty()
                     
                     with st.spinner("Processing data..."):
-                        # Save uploaded file to temp location
-                        temp_path = save_uploaded_file(uploaded_file)
+                        # Workbooks are imported from their cached parse, so only CSVs are saved to disk;
+                        # the importer still gets the upload's name to pick the reader from its suffix
+                        csv_upload = is_csv(uploaded_file.name)
+                        temp_path = save_uploaded_file(uploaded_file) if csv_upload else uploaded_file.name
                         if temp_path:
+                            import_job = None
                             try:
                                 # Update progress
                                 status_container.info("Validating data format...")
                                 progress_bar.progress(25)
                                 
-                                # Clean and validate the data before processing
-                                if uploaded_file.type == "text/csv":
-                                    df = pd.read_csv(temp_path)
-                                else:
-                                    # Read Excel with proper header handling
-                                    file_path = Path(temp_path)
-                                    df = pd.read_excel(
-                                        temp_path,
-                                        engine='openpyxl' if str(file_path).lower().endswith('.xlsx') else 'xlrd',
-                                        header=0
-                                    )
-                                    # Check if first row is metadata and reread with correct header
-                                    if any(df.columns.astype(str).str.contains('Tracking Smartphone', case=False, na=False)):
-                                        df = pd.read_excel(
-                                            temp_path,
-                                            engine='openpyxl' if str(file_path).lower().endswith('.xlsx') else 'xlrd',
-                                            header=1
-                                        )
+                                # Workbooks are parsed once per upload and handed to the importer as is
+                                excel_df = None if csv_upload else read_excel_upload(uploaded_file)
                                 
-                                # Apply data cleaning
-                                df = sanitize_dataframe(df)
+                                # Process the cleaned file on a worker thread, so the preview below
+                                # renders while it runs and the progress bar keeps moving
+                                import_job = import_executor().submit(process_and_insert_data, Path(temp_path), excel_df)
                                 
-                                # Show preview of cleaned data
+                                # Show preview of cleaned data, reusing the rows build_preview already sanitized
+                                if df_preview is None:
+                                    df_preview = cleaned_preview(uploaded_file)
                                 st.write("### Preview of Cleaned Data")
-                                st.dataframe(df.head())
+                                st.dataframe(df_preview[:5])
                                 
-                                # Process the cleaned file
-                                result = process_and_insert_data(Path(temp_path))
+                                progress = 25
+                                while not import_job.done():
+                                    time.sleep(IMPORT_POLL_SECONDS)
+                                    # Creep towards 95% since the importer does not report how far it is
+                                    progress = min(progress + 1, 95)
+                                    progress_bar.progress(progress)
+                                result = import_job.result()
+                                # The next duplicate check must see the rows just imported
+                                existing_package_names.clear()
                                 
                                 # Update progress
                                 progress_bar.progress(100)
@@ -349,11 +516,15 @@ def main():
                                     st.write("### Import Statistics")
                                     col1, col2 = st.columns(2)
                                     with col1:
-                                        st.metric("Total Rows", result["total_rows"])
                                         st.metric("Processed Rows", result["processed_rows"])
                                     with col2:
                                         st.metric("Failed Rows", result["failed_rows"])
-                                        st.metric("Target Table", result["table_name"])
+                                    # As in the overview, the secondary figures share one markdown table
+                                    st.markdown(
+                                        "| Metric | Value |\n| --- | --- |\n"
+                                        f"| Total Rows | {result['total_rows']} |\n"
+                                        f"| Target Table | {result['table_name']} |"
+                                    )
                                     
                                     if result["failed_rows"] > 0:
                                         st.warning(f"⚠️ {result['failed_rows']} rows failed to import. Please check the data format.")
@@ -411,9 +582,9 @@ def main():
                                 status_container.error(f"Error processing data: {str(e)}")
                                 st.error("An unexpected error occurred. Please check the data format and try again.")
                             finally:
-                                # Cleanup temp file
-                                if os.path.exists(temp_path):
-                                    os.unlink(temp_path)
+                                # Cleanup temp file, once the importer is done with it if a rerun cut this run short
+                                if csv_upload:
+                                    remove_when_done(import_job, Path(temp_path))
                         else:
                             progress_bar.progress(100)
                             status_container.error("Failed to save uploaded file")
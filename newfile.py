@@ -1,5 +1,6 @@
 import sqlite3
 import logging
+from schemas import SQLITE_PRAGMAS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -61,6 +62,8 @@ def create_database():
     try:
         # Connect to the SQLite database
         with sqlite3.connect(DATABASE_FILE) as conn:
+            for pragma in SQLITE_PRAGMAS:
+                conn.execute(pragma)
             cursor = conn.cursor()
             # Execute the schema script
             cursor.executescript(schema)
@@ -2,7 +2,20 @@ from datetime import datetime
 from typing import Dict, Any
 
 DATABASE_FILE = "data.db"
-BATCH_SIZE = 1000
+BATCH_SIZE = 10000
+# Bump whenever the CREATE TABLE statements in init_db change
+SCHEMA_VERSION = 1
+
+# Connection settings tuned for bulk inserts, shared by every importer; journal_mode persists
+# in the file, the rest apply per connection
+SQLITE_PRAGMAS = [
+    "PRAGMA busy_timeout=30000",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+]
 
 TABLE_SCHEMAS: Dict[str, Dict[str, Any]] = {
     "Contacts": {
@@ -6,8 +6,11 @@ import re
 from tkinter import Tk, filedialog
 from typing import Optional, List, Dict, Any
 import logging
-from dateutil.parser import parse
-import pytz  # For timezone handling
+from schemas import SQLITE_PRAGMAS
+from utils import (
+    STRING_DTYPE, coerce_int_series, csv_dtypes, header_sets, match_headers, parse_timestamp_flexible,
+    parse_timestamp_series, read_csv_frame, to_sql_values,
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -15,7 +18,7 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Configuration (can be moved to a config file)
 DATABASE_FILE = "data.db"
 DEFAULT_TIMEZONE = "UTC"
-BATCH_SIZE = 1000  # Number of rows to insert at a time
+BATCH_SIZE = 50000  # Number of rows to insert at a time
 
 # Correct table headers with data types for validation
 TABLE_SCHEMAS: Dict[str, Dict[str, Any]] = {
@@ -51,6 +54,12 @@ TABLE_SCHEMAS: Dict[str, Dict[str, Any]] = {
     },
 }
 
+# Original and renamed header sets per table, built once for subset checks in identify_table
+_HEADER_SETS = header_sets(TABLE_SCHEMAS)
+
+# Tables queried by time; their indexes are built after a load rather than updated row by row during it
+_TIME_INDEXED_TABLES = frozenset(name for name, schema in TABLE_SCHEMAS.items() if "time" in schema["columns"])
+
 def init_db():
     """Initializes the SQLite database and creates tables if they don't exist."""
     schema = """
@@ -104,6 +113,8 @@ def init_db():
     """
     try:
         with sqlite3.connect(DATABASE_FILE) as conn:
+            for pragma in SQLITE_PRAGMAS:
+                conn.execute(pragma)
             cursor = conn.cursor()
             cursor.executescript(schema)
             conn.commit()
@@ -111,20 +122,6 @@ def init_db():
     except sqlite3.Error as e:
         logging.error(f"Error initializing database: {e}")
 
-def parse_timestamp_flexible(date_str: str, timezone: str = DEFAULT_TIMEZONE) -> Optional[datetime]:
-    """Parses a date string into a datetime object, handling various formats and timezones."""
-    try:
-        dt = parse(date_str)
-        if dt.tzinfo is None:
-            tz = pytz.timezone(timezone)
-            dt = tz.localize(dt)
-        else:
-            dt = dt.astimezone(pytz.timezone(timezone))
-        return dt
-    except (ValueError, TypeError) as e:
-        logging.warning(f"Failed to parse timestamp '{date_str}': {e}")
-        return None
-
 def validate_data(df: pd.DataFrame, table_name: str) -> pd.DataFrame:
     """Validates data types and columns against the table schema."""
     schema = TABLE_SCHEMAS.get(table_name)
@@ -139,21 +136,24 @@ def validate_data(df: pd.DataFrame, table_name: str) -> pd.DataFrame:
     if missing_columns:
         raise ValueError(f"Missing columns for table {table_name}: {', '.join(missing_columns)}")
 
-    # Ensure DataFrame only contains the expected columns
-    df = df[expected_columns]
-
-    # Validate data types
+    # Validate data types, keeping only the expected columns; the converted columns are
+    # collected and assembled once instead of being written back into a sliced copy one by one
+    validated = {}
     for col, dtype in zip(expected_columns, expected_types):
         try:
             if dtype == datetime:
-                df[col] = df[col].apply(lambda x: parse_timestamp_flexible(x) if pd.notna(x) and isinstance(x, str) else x)
+                validated[col] = parse_timestamp_series(df[col])
             elif dtype == int:
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
+                validated[col] = coerce_int_series(df[col])
+            elif dtype == str:
+                # Text is held in one contiguous buffer per column rather than as Python objects;
+                # missing cells stay missing and are stored as NULL
+                validated[col] = df[col].astype(STRING_DTYPE)
             else:
-                df[col] = df[col].astype(dtype)
+                validated[col] = df[col].astype(dtype)
         except (ValueError, TypeError) as e:
             raise ValueError(f"Type conversion error in column '{col}' for table '{table_name}': {e}")
-    return df
+    return pd.DataFrame(validated, index=df.index)
 
 def process_data(table_name: str, df: pd.DataFrame) -> pd.DataFrame:
     """Processes the data for the given table."""
@@ -170,52 +170,116 @@ def process_data(table_name: str, df: pd.DataFrame) -> pd.DataFrame:
 
 def identify_table(df: pd.DataFrame) -> Optional[str]:
     """Identifies the table based on the file's headers."""
-    file_headers = set(df.columns)
-    for table, schema in TABLE_SCHEMAS.items():
-        if set(schema["renames"].keys()).issubset(file_headers):
-            return table
-        elif set(schema["columns"]).issubset(file_headers):
-            return table
-    return None
+    return match_headers(_HEADER_SETS, frozenset(df.columns))
 
 def insert_data(conn: sqlite3.Connection, table_name: str, df: pd.DataFrame):
     """Inserts data into the database in batches."""
     try:
         total_rows = len(df)
-        for i in range(0, total_rows, BATCH_SIZE):
-            batch_df = df.iloc[i:i + BATCH_SIZE]
-            batch_df.to_sql(table_name, conn, if_exists="append", index=False)
-            logging.info(f"Inserted rows {i} to {min(i + BATCH_SIZE, total_rows)} into {table_name}.")
+        columns = ", ".join(df.columns)
+        placeholders = ", ".join("?" * len(df.columns))
+        sql = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
+        # sqlite3 binds only Python scalars, so NaN/NaT become NULL
+        values = to_sql_values(df)
+
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        # One prepared statement and one transaction for the whole file
+        with conn:
+            for i in range(0, total_rows, BATCH_SIZE):
+                conn.executemany(sql, values.iloc[i:i + BATCH_SIZE].itertuples(index=False, name=None))
+                logging.info(f"Inserted rows {i} to {min(i + BATCH_SIZE, total_rows)} into {table_name}.")
     except Exception as e:
+        # The transaction has been rolled back, so the caller must not report the file as inserted
         logging.error(f"Unexpected error during data insertion into {table_name}: {e}")
+        raise
+
+def enforce_not_null(conn: sqlite3.Connection, table_name: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Fills missing text and drops rows missing any other value for the table's NOT NULL columns."""
+    # Read from the table definition, so the check always matches the constraints insert_data runs into
+    required = [row[1] for row in conn.execute(f"PRAGMA table_info({table_name})") if row[3] and row[1] in df.columns]
+    # Exports leave some required text empty (callex.xlsx has no call types at all), so those rows are
+    # kept with empty text rather than lost
+    text = [col for col in required if pd.api.types.is_string_dtype(df[col])]
+    if text:
+        df = df.fillna({col: "" for col in text})
+    incomplete = df[required].isna().any(axis=1)
+    if incomplete.any():
+        # e.g. a "Feb 29" timestamp with no year, which cannot be parsed; one such row would otherwise
+        # roll back the whole file's insert
+        logging.warning(f"Skipped {incomplete.sum()} rows of {table_name} missing a {' or '.join(required)} value.")
+        df = df[~incomplete]
+    return df
+
+def create_indexes(conn: sqlite3.Connection, table_name: str):
+    """Creates the lookup indexes for a table once its rows are loaded."""
+    # InstalledApps.package_name needs none: its UNIQUE constraint already keeps an index
+    if table_name in _TIME_INDEXED_TABLES:
+        with conn:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name.lower()}_time ON {table_name}(time)")
+
+def process_and_insert_dataframe(df: pd.DataFrame, table_name: Optional[str] = None):
+    """Processes an already-read DataFrame and inserts it into the database in batches."""
+    table_name = table_name or identify_table(df)
+    if not table_name:
+        raise ValueError("Could not identify the table based on the file headers.")
+    
+    logging.info(f"Identified table: {table_name}")
+    df = process_data(table_name, df)
+
+    with sqlite3.connect(DATABASE_FILE) as conn:
+        insert_data(conn, table_name, enforce_not_null(conn, table_name, df))
+        create_indexes(conn, table_name)
+
+    logging.info(f"Data insertion complete for {table_name}.")
+
+def read_header(file_path: Path) -> pd.Index:
+    """Reads only a file's column headers, so the table is known before the rows are parsed."""
+    if file_path.suffix.lower() == ".csv":
+        return pd.read_csv(file_path, nrows=0).columns
+    try:
+        # openpyxl's read-only mode stops after the header row, where calamine would load the whole sheet
+        engine = "openpyxl" if file_path.suffix.lower() == ".xlsx" else None
+        return pd.read_excel(file_path, skiprows=1, nrows=0, engine=engine).columns  # Skip metadata row
+    except ImportError:
+        return pd.read_excel(file_path, skiprows=1, nrows=0).columns  # Skip metadata row
+
+def read_body(file_path: Path, table_name: str) -> pd.DataFrame:
+    """Reads a file's rows, with CSV column types taken from the table schema."""
+    if file_path.suffix.lower() == ".csv":
+        df = read_csv_frame(file_path, csv_dtypes(read_header(file_path), TABLE_SCHEMAS[table_name]))
+        logging.info(f"Successfully read CSV file: {file_path}")
+    else:
+        # calamine parses legacy xls in Rust; xlsx stays on openpyxl, which keeps long numeric cells
+        # such as phone numbers exact where calamine reads them as float64
+        engine = "calamine" if file_path.suffix.lower() == ".xls" else "openpyxl"
+        try:
+            df = pd.read_excel(file_path, skiprows=1, engine=engine)  # Skip metadata row
+        except ImportError:
+            df = pd.read_excel(file_path, skiprows=1)  # Skip metadata row
+        logging.info(f"Successfully read Excel file with metadata skipped: {file_path}")
+    return df
 
 def process_and_insert_data(file_path: Path):
     """Processes data and inserts it into the database in batches."""
     try:
         # Dynamically handle CSV or Excel
-        if file_path.suffix.lower() == ".csv":
-            df = pd.read_csv(file_path)
-            logging.info(f"Successfully read CSV file: {file_path}")
-        elif file_path.suffix.lower() in [".xls", ".xlsx"]:
-            df = pd.read_excel(file_path, skiprows=1)  # Skip metadata row
-            logging.info(f"Successfully read Excel file with metadata skipped: {file_path}")
-        else:
+        if file_path.suffix.lower() not in [".csv", ".xls", ".xlsx"]:
             raise ValueError("Unsupported file type.")
 
-        table_name = identify_table(df)
+        # Files matching no schema are rejected from their headers, before any rows are parsed
+        table_name = identify_table(pd.DataFrame(columns=read_header(file_path)))
         if not table_name:
             raise ValueError("Could not identify the table based on the file headers.")
-        
-        logging.info(f"Identified table: {table_name}")
-        df = process_data(table_name, df)
-
-        with sqlite3.connect(DATABASE_FILE) as conn:
-            insert_data(conn, table_name, df)
 
-        logging.info(f"Data insertion complete for {table_name}.")
+        # Callers that already hold the parsed data skip the read by using process_and_insert_dataframe
+        process_and_insert_dataframe(read_body(file_path, table_name), table_name)
 
     except Exception as e:
         logging.error(f"Unexpected error during file processing: {e}")
+    finally:
+        # Parsed timestamps are only repeated within a file, so the memo is not kept between files
+        parse_timestamp_flexible.cache_clear()
 
 def select_file() -> Optional[Path]:
     """Opens a file dialog to select a file and returns the file path."""
@@ -4,10 +4,14 @@ from datetime import datetime
 from pathlib import Path
 import re
 from tkinter import Tk, filedialog
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterator
 import logging
-from dateutil.parser import parse
-import pytz  # For timezone handling
+from concurrent.futures import ThreadPoolExecutor
+from schemas import SQLITE_PRAGMAS
+from utils import (
+    coerce_int_series, csv_dtypes, header_sets, match_headers, parse_timestamp_flexible, parse_timestamp_series,
+    read_csv_frame, to_sql_values,
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -16,6 +20,15 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 DATABASE_FILE = "data.db"
 DEFAULT_TIMEZONE = "UTC"
 BATCH_SIZE = 1000  # Number of rows to insert at a time
+# CSVs at least this large are streamed in CSV_CHUNK_ROWS chunks rather than read whole
+CSV_STREAM_MIN_BYTES = 64 * 1024 * 1024
+CSV_CHUNK_ROWS = 100_000
+# Loads from files at least this large drop a table's plain indexes first and rebuild them once at the end
+INDEX_DEFER_MIN_BYTES = CSV_STREAM_MIN_BYTES
+
+# Larger pages suit the text-heavy Calls/SMS rows; init_db applies this to new databases only, since
+# converting an existing one means a VACUUM outside WAL mode that should be run as a separate migration
+DB_PAGE_SIZE = 8192
 
 # Correct table headers with data types for validation
 TABLE_SCHEMAS: Dict[str, Dict[str, Any]] = {
@@ -51,6 +64,23 @@ TABLE_SCHEMAS: Dict[str, Dict[str, Any]] = {
     },
 }
 
+# Original and renamed header sets per table, built once for subset checks in identify_table
+_HEADER_SETS = header_sets(TABLE_SCHEMAS)
+
+# Files whose headers are exactly one schema's set resolve with a single lookup; each entry holds what the
+# ordered subset scan returns for that set, so the shortcut can never disagree with it
+_HEADER_FINGERPRINTS = {
+    header_set: match_headers(_HEADER_SETS, header_set) for _, rename_keys, columns in _HEADER_SETS for header_set in (rename_keys, columns)
+}
+
+# INSERT statements per table, built once so every batch reuses the same prepared statement text;
+# InstalledApps skips packages that are already stored instead of failing on its UNIQUE constraint
+_INSERT_SQL = {
+    name: f"INSERT INTO {name} ({', '.join(schema['columns'])}) VALUES ({', '.join('?' * len(schema['columns']))})"
+    for name, schema in TABLE_SCHEMAS.items()
+}
+_INSERT_SQL["InstalledApps"] = _INSERT_SQL["InstalledApps"].replace("INSERT INTO", "INSERT OR IGNORE INTO", 1)
+
 def init_db():
     """Initializes the SQLite database and creates tables if they don't exist."""
     schema = """
@@ -105,6 +135,11 @@ def init_db():
     """
     try:
         with sqlite3.connect(DATABASE_FILE) as conn:
+            # The page size of an empty database is fixed by its first write, so it is set before the pragmas
+            if conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone() is None:
+                conn.execute(f"PRAGMA page_size={DB_PAGE_SIZE}")
+            for pragma in SQLITE_PRAGMAS:
+                conn.execute(pragma)
             cursor = conn.cursor()
             cursor.executescript(schema)
             conn.commit()
@@ -112,20 +147,6 @@ def init_db():
     except sqlite3.Error as e:
         logging.error(f"Error initializing database: {e}")
 
-def parse_timestamp_flexible(date_str: str, timezone: str = DEFAULT_TIMEZONE) -> Optional[datetime]:
-    """Parses a date string into a datetime object, handling various formats and timezones."""
-    try:
-        dt = parse(date_str)
-        if dt.tzinfo is None:
-            tz = pytz.timezone(timezone)
-            dt = tz.localize(dt)
-        else:
-            dt = dt.astimezone(pytz.timezone(timezone))
-        return dt
-    except (ValueError, TypeError) as e:
-        logging.warning(f"Failed to parse timestamp '{date_str}': {e}")
-        return None
-
 def validate_data(df: pd.DataFrame, table_name: str) -> pd.DataFrame:
     """Validates data types and columns against the table schema."""
     schema = TABLE_SCHEMAS.get(table_name)
@@ -140,27 +161,26 @@ def validate_data(df: pd.DataFrame, table_name: str) -> pd.DataFrame:
     if missing_columns:
         raise ValueError(f"Missing columns for table {table_name}: {', '.join(missing_columns)}")
 
-    # Ensure DataFrame only contains the expected columns
-    df = df[expected_columns]
-
-    # Validate data types
+    # Validate data types, keeping only the expected columns; the converted columns are
+    # collected and assembled once instead of being written back into a sliced copy one by one
+    validated = {}
     for col, dtype in zip(expected_columns, expected_types):
         try:
             if dtype == datetime:
-                df[col] = df[col].apply(lambda x: parse_timestamp_flexible(x) if pd.notna(x) and isinstance(x, str) else x)
-                # Additional check to ensure conversion was successful
-                failed_conversions = df[col].isnull().sum()
+                validated[col] = parse_timestamp_series(df[col])
+                # Additional check to ensure conversion was successful, not counting cells that were empty already
+                failed_conversions = validated[col].isnull().sum() - df[col].isnull().sum()
                 if failed_conversions > 0:
                    logging.warning(f"Failed to convert {failed_conversions} values in column '{col}' to datetime for table {table_name}.")
             elif dtype == int:
                     # Ensure that numeric values are converted safely
-                    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
+                    validated[col] = coerce_int_series(df[col])
             else:
-                df[col] = df[col].astype(dtype)
+                validated[col] = df[col].astype(dtype)
         except (ValueError, TypeError) as e:
             raise ValueError(f"Type conversion error in column '{col}' for table '{table_name}': {e}")
 
-    return df
+    return pd.DataFrame(validated, index=df.index)
 
 def check_existing_records(df: pd.DataFrame, table_name: str) -> pd.DataFrame:
     """Check for existing records in database and remove them from the dataframe."""
@@ -208,56 +228,61 @@ def process_data(table_name: str, df: pd.DataFrame) -> pd.DataFrame:
 
 def identify_table(df: pd.DataFrame) -> Optional[str]:
     """Identifies the table based on the file's headers."""
-    file_headers = set(df.columns)
-    for table, schema in TABLE_SCHEMAS.items():
-        if set(schema["renames"].keys()).issubset(file_headers):
-            return table
-        elif set(schema["columns"]).issubset(file_headers):
-            return table
-    return None
+    file_headers = frozenset(df.columns)
+    # Headers with extra columns fall back to the subset scan
+    table = _HEADER_FINGERPRINTS.get(file_headers)
+    return table if table is not None else match_headers(_HEADER_SETS, file_headers)
 
 def insert_data(conn: sqlite3.Connection, table_name: str, df: pd.DataFrame) -> int:
     """Inserts data into the database in batches, handling unique constraints."""
     try:
         total_rows = len(df)
         successful_inserts = 0
+
+        sql = _INSERT_SQL[table_name]
+        if not conn.in_transaction:
+            # A savepoint taken outside a transaction starts one, and its RELEASE would then commit every
+            # batch on its own; an explicit BEGIN keeps the batches in one transaction the caller ends
+            conn.execute("BEGIN")
+        if table_name != "InstalledApps":
+            # sqlite3 binds only Python scalars, so NaN/NaT become NULL
+            values = to_sql_values(df)
         
         for i in range(0, total_rows, BATCH_SIZE):
             batch_df = df.iloc[i:i + BATCH_SIZE]
             
             if table_name == "InstalledApps":
                 # For InstalledApps, use INSERT OR IGNORE to skip duplicates
-                cursor = conn.cursor()
-                for _, row in batch_df.iterrows():
-                    try:
-                        # Convert datetime to string if it's not None
-                        install_date = row['install_date'].isoformat() if pd.notnull(row['install_date']) else None
-                        
-                        cursor.execute("""
-                            INSERT OR IGNORE INTO InstalledApps 
-                            (application_name, package_name, install_date)
-                            VALUES (?, ?, ?)
-                        """, (row['application_name'], row['package_name'], install_date))
-                        
-                        if cursor.rowcount > 0:
-                            successful_inserts += 1
-                            logging.info(f"Inserted new record: {row['package_name']}")
-                        else:
-                            logging.info(f"Skipped duplicate package_name: {row['package_name']}")
-                    except sqlite3.Error as e:
-                        logging.warning(f"Could not process row with package_name {row['package_name']}: {e}")
-                conn.commit()
+                # Raw column values are zipped into tuples as executemany consumes them, so no row
+                # objects or intermediate list are built
+                rows = (
+                    # Convert datetime to string if it's not None
+                    (application_name, package_name, install_date.isoformat() if pd.notnull(install_date) else None)
+                    for application_name, package_name, install_date in zip(
+                        batch_df['application_name'], batch_df['package_name'], batch_df['install_date']
+                    )
+                )
+                # One prepared statement for the batch; rowcount sums the rows actually inserted
+                cursor = conn.executemany(sql, rows)
+                successful_inserts += cursor.rowcount
+                logging.info(f"Inserted {cursor.rowcount} new records, skipped {len(batch_df) - cursor.rowcount} duplicate package names")
             else:
-                # For other tables, use the standard batch insert
+                # For other tables, one prepared statement per batch; the savepoint lets a failed
+                # batch be undone without losing the batches already written in this transaction
+                rows = list(values.iloc[i:i + BATCH_SIZE].itertuples(index=False, name=None))
                 try:
-                    batch_df.to_sql(table_name, conn, if_exists="append", index=False)
-                    successful_inserts += len(batch_df)
+                    conn.execute("SAVEPOINT batch")
+                    conn.executemany(sql, rows)
+                    conn.execute("RELEASE batch")
+                    successful_inserts += len(rows)
                 except sqlite3.IntegrityError as e:
                     logging.warning(f"Integrity error during batch insert: {e}")
+                    conn.execute("ROLLBACK TO batch")
+                    conn.execute("RELEASE batch")
                     # Fall back to row-by-row insert for the batch
-                    for _, row in batch_df.iterrows():
+                    for row in rows:
                         try:
-                            row.to_frame().T.to_sql(table_name, conn, if_exists="append", index=False)
+                            conn.execute(sql, row)
                             successful_inserts += 1
                         except sqlite3.IntegrityError:
                             logging.info(f"Skipped duplicate record in {table_name}")
@@ -271,34 +296,101 @@ def insert_data(conn: sqlite3.Connection, table_name: str, df: pd.DataFrame) ->
         logging.error(f"Unexpected error during data insertion into {table_name}: {e}")
         raise
 
+def drop_plain_indexes(conn: sqlite3.Connection, table_name: str) -> List[str]:
+    """Drops a table's non-unique user indexes, returning the statements that recreate them."""
+    # UNIQUE indexes stay, since they are what keeps duplicate rows out during the load
+    names = [name for _, name, unique, origin, _ in conn.execute(f"PRAGMA index_list({table_name})")
+             if origin == "c" and not unique]
+    statements = []
+    for name in names:
+        statements.append(conn.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone()[0])
+        conn.execute(f'DROP INDEX "{name}"')
+    if names:
+        logging.info(f"Dropped {len(names)} indexes on {table_name} for the bulk load")
+    return statements
+
+def read_csv_chunks(file_path: Path, columns: pd.Index, table_name: str) -> Iterator[pd.DataFrame]:
+    """Reads a CSV with its column types taken from the table schema, in chunks once it is large."""
+    dtype = csv_dtypes(columns, TABLE_SCHEMAS[table_name])
+    if file_path.stat().st_size >= CSV_STREAM_MIN_BYTES:
+        # Only one chunk is held at a time; the pyarrow engine has no chunked mode, so the C parser reads these
+        yield from pd.read_csv(file_path, dtype=dtype, chunksize=CSV_CHUNK_ROWS, memory_map=True)
+    else:
+        yield read_csv_frame(file_path, dtype)
+    logging.info(f"Successfully read CSV file: {file_path}")
+
+def read_ahead(chunks: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    """Yields parsed chunks, parsing the next one while the caller processes and inserts the current one."""
+    # Only the CSV parse runs on the worker, where it largely releases the GIL; validation and the
+    # existing-record lookups stay on the calling thread, so results never depend on timing
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = executor.submit(next, chunks, None)
+        while (chunk := pending.result()) is not None:
+            pending = executor.submit(next, chunks, None)
+            yield chunk
+
 def process_and_insert_data(file_path: Path) -> Dict[str, int]:
     """Processes data and inserts it into the database in batches."""
     try:
         # Dynamically handle CSV or Excel
         if file_path.suffix.lower() == ".csv":
-            df = pd.read_csv(file_path)
-            logging.info(f"Successfully read CSV file: {file_path}")
+            # Identify the table from the header, then stream the rows through validation
+            header = pd.read_csv(file_path, nrows=0)
+            table_name = identify_table(header)
+            chunks = read_csv_chunks(file_path, header.columns, table_name) if table_name else iter(())
         elif file_path.suffix.lower() in [".xls", ".xlsx"]:
-            df = pd.read_excel(file_path)
+            # calamine parses legacy xls in Rust; xlsx stays on openpyxl, which keeps long numeric cells
+            # such as phone numbers exact where calamine reads them as float64
+            engine = "calamine" if file_path.suffix.lower() == ".xls" else "openpyxl"
+            try:
+                df = pd.read_excel(file_path, engine=engine)
+            except ImportError:
+                df = pd.read_excel(file_path)
             logging.info(f"Successfully read Excel file: {file_path}")
+            # Workbooks are parsed in one go, so they are validated as a single chunk
+            table_name = identify_table(df)
+            chunks = iter([df])
         else:
             raise ValueError("Unsupported file type.")
 
-        table_name = identify_table(df)
         if not table_name:
             raise ValueError("Could not identify the table based on the file headers.")
         
         logging.info(f"Identified table: {table_name}")
-        df = process_data(table_name, df)
+        total_rows = processed_rows = 0
+        # Package names from earlier chunks, since process_data only drops duplicates within a chunk
+        seen_packages = set()
 
         with sqlite3.connect(DATABASE_FILE) as conn:
-            processed_rows = insert_data(conn, table_name, df)
+            for pragma in SQLITE_PRAGMAS:
+                conn.execute(pragma)
+            # The schema declares no foreign keys, so none are checked per row during the load
+            conn.execute("PRAGMA foreign_keys=OFF")
+            # One sequential build per index after a large load is cheaper than updating each index row by row
+            deferred = drop_plain_indexes(conn, table_name) if file_path.stat().st_size >= INDEX_DEFER_MIN_BYTES else []
+            try:
+                # The whole file goes in as one transaction, committed only if every batch succeeds;
+                # it is begun explicitly so nothing inside can open and commit one of its own
+                with conn:
+                    conn.execute("BEGIN")
+                    for chunk in read_ahead(chunks):
+                        chunk = process_data(table_name, chunk)
+                        if table_name == "InstalledApps":
+                            chunk = chunk[~chunk['package_name'].isin(seen_packages)]
+                            seen_packages.update(chunk['package_name'])
+                        total_rows += len(chunk)
+                        processed_rows += insert_data(conn, table_name, chunk)
+            finally:
+                # Rebuilt whether or not the load committed, so a failed import leaves the indexes in place
+                with conn:
+                    for statement in deferred:
+                        conn.execute(statement)
             
         return {
             "table_name": table_name,
-            "total_rows": len(df),
+            "total_rows": total_rows,
             "processed_rows": processed_rows,
-            "failed_rows": len(df) - processed_rows
+            "failed_rows": total_rows - processed_rows
         }
 
     except ValueError as ve:
@@ -313,6 +405,9 @@ def process_and_insert_data(file_path: Path) -> Dict[str, int]:
     except Exception as e:
         logging.error(f"Unexpected error during file processing: {e}")
         raise
+    finally:
+        # Parsed timestamps are only repeated within a file, so the memo is not kept between files
+        parse_timestamp_flexible.cache_clear()
 
 def select_file() -> Optional[Path]:
     """Opens a file dialog to select a file and returns the file path."""
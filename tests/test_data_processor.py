@@ -0,0 +1,85 @@
+import sqlite3
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import data_processor
+
+SAMPLES = Path(__file__).resolve().parent.parent
+# Contactsex.xlsx stores these as numeric cells with more digits than a float64 holds
+LONG_PHONE_NUMBERS = ["1866894684818668946848", "1800922020418009220204", "70281217087028121708"]
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    path = tmp_path / "data.db"
+    monkeypatch.setattr(data_processor, "DATABASE_FILE", str(path))
+    data_processor.init_db()
+    return path
+
+
+def count_rows(path, table):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def apps(names):
+    return pd.DataFrame({
+        "application_name": [f"App {name}" for name in names],
+        "package_name": names,
+        "install_date": pd.to_datetime(["2024-09-09 12:56"] * len(names), utc=True),
+    })
+
+
+def test_open_writer_commits_chunks_and_counts_rows(db):
+    with data_processor.open_writer("InstalledApps") as write:
+        assert write(apps(["a", "b"])) == 2
+        assert write(apps(["c"])) == 1
+
+    assert count_rows(db, "InstalledApps") == 3
+
+
+def test_open_writer_rolls_back_on_integrity_error(db):
+    with pytest.raises(sqlite3.IntegrityError):
+        with data_processor.open_writer("InstalledApps") as write:
+            write(apps(["a", "b"]))
+            write(apps(["b"]))
+
+    assert count_rows(db, "InstalledApps") == 0
+
+
+def test_process_and_insert_data_reports_inserted_rows(db, tmp_path):
+    csv = tmp_path / "keylogs.csv"
+    csv.write_text("Application,Time,Text\n" + "".join(f"app{i},2024-09-09 12:56:00,text\n" for i in range(3)))
+
+    stats = data_processor.process_and_insert_data(csv)
+
+    assert stats["table_name"] == "Keylogs"
+    assert stats["total_rows"] == stats["processed_rows"] == 3
+    assert count_rows(db, "Keylogs") == 3
+
+
+def test_process_and_insert_data_keeps_long_xlsx_numbers_exact(db):
+    data_processor.process_and_insert_data(SAMPLES / "Contactsex.xlsx")
+
+    with sqlite3.connect(db) as conn:
+        stored = {row[0] for row in conn.execute("SELECT phone_number FROM Contacts")}
+    assert set(LONG_PHONE_NUMBERS) <= stored
+
+
+def test_validate_data_keeps_large_durations_and_input_frame():
+    df = pd.DataFrame({
+        "call_type": ["Incoming", "Outgoing"],
+        "time": ["2024-09-09 12:56:00"] * 2,
+        "from_to": ["+15550000000"] * 2,
+        "duration": [2**31 + 5, float("nan")],
+        "location": ["Home"] * 2,
+    })
+    original = df.copy()
+
+    result = data_processor.validate_data(df, "Calls")
+
+    assert result["duration"].tolist() == [2**31 + 5, 0]
+    assert result["duration"].dtype == "int64"
+    pd.testing.assert_frame_equal(df, original)
@@ -0,0 +1,43 @@
+import io
+
+import openpyxl
+import pandas as pd
+import pytest
+from streamlit.runtime.uploaded_file_manager import UploadedFile, UploadedFileRec
+
+import main
+
+XLSX_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def upload(name, data, mime_type):
+    return UploadedFile(UploadedFileRec(name, name, mime_type, data), None)
+
+
+def test_build_preview_handles_mixed_type_headers():
+    workbook = openpyxl.Workbook()
+    # A sheet whose header row holds a number next to text
+    workbook.active.append([2024, "Name"])
+    workbook.active.append([1, "a"])
+    workbook.active.append([2, None])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+
+    _, stats = main.build_preview(upload("mixed.xlsx", buffer.getvalue(), XLSX_TYPE))
+
+    column_info = stats["column_info"]
+    assert column_info.column_names == main.COLUMN_ANALYSIS_FIELDS + ["Missing (%)"]
+    assert column_info.column("Column").to_pylist() == ["2024", "Name"]
+    assert column_info.column("Null Count").to_pylist() == [0, 1]
+
+
+def test_read_preview_with_polars():
+    pytest.importorskip("polars")
+    source = io.BytesIO(b"Application,Time,Text\napp0,2024-09-09 12:56:00,a\napp1,2024-09-09 12:57:00,\napp2,,c\n")
+
+    df = main.read_preview(source, nrows=2)
+
+    assert df.columns.tolist() == ["Application", "Time", "Text"]
+    assert df["Application"].tolist() == ["app0", "app1"]
+    assert all(isinstance(dtype, pd.ArrowDtype) for dtype in df.dtypes)
+    assert df["Text"].isna().tolist() == [False, True]
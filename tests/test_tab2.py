@@ -0,0 +1,92 @@
+import logging
+import sqlite3
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import tab2
+
+SAMPLES = Path(__file__).resolve().parent.parent
+# Contactsex.xlsx stores these as numeric cells with more digits than a float64 holds
+LONG_PHONE_NUMBERS = ["1866894684818668946848", "1800922020418009220204", "70281217087028121708"]
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    path = tmp_path / "data.db"
+    monkeypatch.setattr(tab2, "DATABASE_FILE", str(path))
+    tab2.init_db()
+    return path
+
+
+def count_rows(path, table):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_insert_data_failure_rolls_back_and_raises(db, monkeypatch):
+    monkeypatch.setattr(tab2, "BATCH_SIZE", 2)
+    # The last row breaks the NOT NULL constraint on application, after two batches went in
+    df = pd.DataFrame({
+        "application": ["app0", "app1", "app2", "app3", None],
+        "time": pd.to_datetime(["2024-09-09 12:56"] * 5, utc=True),
+        "text": ["text"] * 5,
+    })
+
+    with sqlite3.connect(db) as conn:
+        with pytest.raises(sqlite3.IntegrityError):
+            tab2.insert_data(conn, "Keylogs", df)
+
+    assert count_rows(db, "Keylogs") == 0
+
+
+def test_process_and_insert_dataframe_does_not_report_failed_insert(db, caplog):
+    # The repeated package breaks the UNIQUE constraint on package_name
+    df = pd.DataFrame({
+        "Application Name": ["App", "App"],
+        "Package Name": ["pkg", "pkg"],
+        "Installed Date": ["2024-09-09 12:56:00"] * 2,
+    })
+    caplog.set_level(logging.INFO)
+
+    with pytest.raises(sqlite3.IntegrityError):
+        tab2.process_and_insert_dataframe(df, "InstalledApps")
+
+    assert "Data insertion complete" not in caplog.text
+    assert count_rows(db, "InstalledApps") == 0
+
+
+def test_process_and_insert_dataframe_skips_rows_missing_required_values(db, caplog):
+    # "Feb 29" without a year cannot be parsed, leaving no value for the NOT NULL time column
+    df = pd.DataFrame({
+        "Application": ["app0", "app1", "app2"],
+        "Time": ["Sep 9, 12:56 PM", "Feb 29, 10:23 AM", "Sep 9, 12:57 PM"],
+        "Text": ["text", "text", None],
+    })
+
+    tab2.process_and_insert_dataframe(df, "Keylogs")
+
+    assert count_rows(db, "Keylogs") == 2
+    assert "Skipped 1 rows of Keylogs" in caplog.text
+
+
+def test_read_body_keeps_long_xlsx_numbers_exact():
+    df = tab2.read_body(SAMPLES / "Contactsex.xlsx", "Contacts")
+
+    assert set(LONG_PHONE_NUMBERS) <= set(df["Phone Number"].astype(str))
+
+
+def test_process_and_insert_dataframe_stores_missing_text_as_null(db):
+    df = pd.DataFrame({
+        "Application": [None, "app1"],
+        "Time": ["Sep 9, 12:56 PM"] * 2,
+        "Text": ["text", None],
+    })
+
+    tab2.process_and_insert_dataframe(df, "Keylogs")
+
+    with sqlite3.connect(db) as conn:
+        rows = conn.execute("SELECT application, text FROM Keylogs ORDER BY keylog_id").fetchall()
+    # application is NOT NULL, so missing names are kept as empty text
+    assert rows == [("", "text"), ("app1", None)]
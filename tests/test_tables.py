@@ -0,0 +1,154 @@
+import sqlite3
+import threading
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import tables
+
+SAMPLES = Path(__file__).resolve().parent.parent
+# Contactsex.xlsx stores these as numeric cells with more digits than a float64 holds
+LONG_PHONE_NUMBERS = ["1866894684818668946848", "1800922020418009220204", "70281217087028121708"]
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    path = tmp_path / "data.db"
+    monkeypatch.setattr(tables, "DATABASE_FILE", str(path))
+    tables.init_db()
+    return path
+
+
+def count_rows(path, table):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def keylogs(n):
+    return pd.DataFrame({
+        "application": [f"app{i}" for i in range(n)],
+        "time": pd.to_datetime(["2024-09-09 12:56"] * n, utc=True),
+        "text": ["text"] * n,
+    })
+
+
+def test_insert_data_failed_batch_leaves_no_rows(db, monkeypatch):
+    monkeypatch.setattr(tables, "BATCH_SIZE", 2)
+    df = keylogs(4)
+    # A value sqlite3 cannot bind makes the second batch fail after the first one was written
+    df["text"] = df["text"].astype(object)
+    df.loc[3, "text"] = object()
+
+    conn = sqlite3.connect(db)
+    with pytest.raises(sqlite3.Error):
+        with conn:
+            tables.insert_data(conn, "Keylogs", df)
+    conn.close()
+
+    assert count_rows(db, "Keylogs") == 0
+
+
+def test_insert_data_leaves_transaction_to_caller(db, monkeypatch):
+    monkeypatch.setattr(tables, "BATCH_SIZE", 2)
+    conn = sqlite3.connect(db)
+    assert tables.insert_data(conn, "Keylogs", keylogs(5)) == 5
+    assert conn.in_transaction
+    assert count_rows(db, "Keylogs") == 0
+    conn.commit()
+    conn.close()
+
+    assert count_rows(db, "Keylogs") == 5
+
+
+def test_process_and_insert_data_rolls_back_whole_file(db, tmp_path, monkeypatch):
+    csv = tmp_path / "keylogs.csv"
+    csv.write_text("Application,Time,Text\n" + "".join(f"app{i},\"Sep 9, 12:56 PM\",text\n" for i in range(6)))
+    # Stream the file in two-row chunks so several inserts run before the failure
+    monkeypatch.setattr(tables, "CSV_STREAM_MIN_BYTES", 0)
+    monkeypatch.setattr(tables, "CSV_CHUNK_ROWS", 2)
+    insert_data = tables.insert_data
+    calls = []
+
+    def failing_insert(conn, table_name, df):
+        calls.append(len(df))
+        if len(calls) == 2:
+            raise RuntimeError("insert failed")
+        return insert_data(conn, table_name, df)
+
+    monkeypatch.setattr(tables, "insert_data", failing_insert)
+    with pytest.raises(RuntimeError):
+        tables.process_and_insert_data(csv)
+
+    assert count_rows(db, "Keylogs") == 0
+
+
+def test_process_and_insert_data_commits_file(db, tmp_path, monkeypatch):
+    csv = tmp_path / "keylogs.csv"
+    csv.write_text("Application,Time,Text\n" + "".join(f"app{i},\"Sep 9, 12:56 PM\",text\n" for i in range(6)))
+    monkeypatch.setattr(tables, "CSV_STREAM_MIN_BYTES", 0)
+    monkeypatch.setattr(tables, "CSV_CHUNK_ROWS", 2)
+
+    stats = tables.process_and_insert_data(csv)
+
+    assert stats["table_name"] == "Keylogs"
+    assert stats["processed_rows"] == 6
+    assert count_rows(db, "Keylogs") == 6
+
+
+def page_size(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("PRAGMA page_size").fetchone()[0]
+
+
+def test_init_db_sets_page_size_on_new_database(db):
+    assert page_size(db) == tables.DB_PAGE_SIZE
+
+
+def test_init_db_leaves_existing_page_size(tmp_path, monkeypatch):
+    path = tmp_path / "existing.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("PRAGMA page_size=4096")
+        conn.execute("CREATE TABLE notes (body TEXT)")
+    monkeypatch.setattr(tables, "DATABASE_FILE", str(path))
+
+    tables.init_db()
+
+    assert page_size(path) == 4096
+    assert count_rows(path, "Keylogs") == 0
+
+
+def test_process_and_insert_data_looks_up_existing_records_on_writer_thread(db, tmp_path, monkeypatch):
+    csv = tmp_path / "apps.csv"
+    csv.write_text(
+        "Application Name,Package Name,Installed Date\n"
+        + "".join(f"App {i},pkg{i % 3},2024-09-09 12:56:00\n" for i in range(6))
+    )
+    monkeypatch.setattr(tables, "CSV_STREAM_MIN_BYTES", 0)
+    monkeypatch.setattr(tables, "CSV_CHUNK_ROWS", 2)
+    check_existing_records = tables.check_existing_records
+    threads = []
+
+    def recording_check(df, table_name):
+        threads.append(threading.current_thread())
+        return check_existing_records(df, table_name)
+
+    monkeypatch.setattr(tables, "check_existing_records", recording_check)
+    stats = tables.process_and_insert_data(csv)
+
+    assert threads and all(thread is threading.main_thread() for thread in threads)
+    assert stats["processed_rows"] == 3
+    assert count_rows(db, "InstalledApps") == 3
+
+
+def test_process_and_insert_data_keeps_long_xlsx_numbers_exact(db, monkeypatch):
+    # tables.py expects the header in the first row, so the export's title row is skipped here;
+    # saving a trimmed copy with openpyxl would already write the long numbers as floats
+    read_excel = pd.read_excel
+    monkeypatch.setattr(pd, "read_excel", lambda *args, **kwargs: read_excel(*args, header=1, **kwargs))
+
+    tables.process_and_insert_data(SAMPLES / "Contactsex.xlsx")
+
+    with sqlite3.connect(db) as conn:
+        stored = {row[0] for row in conn.execute("SELECT phone_number FROM Contacts")}
+    assert set(LONG_PHONE_NUMBERS) <= stored
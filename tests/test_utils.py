@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from datetime import datetime
+
+import utils
+from utils import sanitize_dataframe
+
+SCHEMAS = {
+    "Calls": {
+        "columns": ["call_type", "time", "duration"],
+        "types": [str, datetime, int],
+        "renames": {"Call type": "call_type", "Time": "time", "Duration (Sec)": "duration"},
+    },
+    "Keylogs": {
+        "columns": ["application", "time", "text"],
+        "types": [str, datetime, str],
+        "renames": {"Application": "application", "Time": "time", "Text": "text"},
+    },
+}
+
+
+@pytest.mark.parametrize("dtype", [object, pd.ArrowDtype(pa.string())])
+def test_sanitize_dataframe_strips_blanks_and_non_ascii(dtype):
+    df = pd.DataFrame({
+        "text": pd.Series(["  caf\xe9 ", "ok", " ", None, "☃"], dtype=dtype),
+        "count": [1, 2, 3, 4, 5],
+    })
+
+    result = sanitize_dataframe(df)
+
+    assert result["text"].tolist()[:2] == ["caf", "ok"]
+    assert result["text"].isna().tolist() == [False, False, True, True, False]
+    assert result["text"].iloc[4] == ""
+    assert result["count"].tolist() == [1, 2, 3, 4, 5]
+
+
+def test_sanitize_dataframe_drops_rows_left_empty():
+    df = pd.DataFrame({"a": ["x", "  "], "b": [np.nan, np.nan]})
+
+    assert sanitize_dataframe(df)["a"].tolist() == ["x"]
+
+
+def test_match_headers_accepts_original_or_renamed_headers():
+    sets = utils.header_sets(SCHEMAS)
+
+    assert utils.match_headers(sets, frozenset(["Call type", "Time", "Duration (Sec)", "Extra"])) == "Calls"
+    assert utils.match_headers(sets, frozenset(["application", "time", "text"])) == "Keylogs"
+    assert utils.match_headers(sets, frozenset(["Time"])) is None
+
+
+def test_csv_dtypes_pins_text_and_timestamps_only():
+    columns = pd.Index(["Call type", "Time", "Duration (Sec)", "Other"])
+
+    assert utils.csv_dtypes(columns, SCHEMAS["Calls"]) == {"Call type": object, "Time": object}
+
+
+def test_coerce_int_series_zeroes_unparseable_and_missing():
+    values = pd.Series(["12", "35 Sec", None, "12"], dtype=object)
+
+    assert utils.coerce_int_series(values).tolist() == [12, 0, 0, 12]
+
+
+def test_parse_timestamp_series_falls_back_to_dateutil():
+    parsed = utils.parse_timestamp_series(pd.Series(["2024-09-09 12:56:00", "Sep 9 2024, 12:56 PM", None]))
+
+    assert parsed.iloc[0] == parsed.iloc[1] == pd.Timestamp("2024-09-09 12:56", tz="UTC")
+    assert pd.isna(parsed.iloc[2])
+
+
+@pytest.mark.parametrize("values", [
+    ["2024-09-09 12:56:00", "Sep 9 2024, 12:56 PM"],
+    ["2024-09-09 12:56:00", "2024-09-09T18:56:00+02:00"],
+])
+def test_parse_timestamp_series_localizes_naive_values(values):
+    parsed = utils.parse_timestamp_series(pd.Series(values), "America/New_York")
+
+    assert parsed.tolist() == [pd.Timestamp("2024-09-09 12:56", tz="America/New_York")] * 2
+
+
+def test_to_sql_values_binds_plain_scalars_and_nulls():
+    df = pd.DataFrame({
+        "time": pd.to_datetime(["2024-09-09 12:56", None], utc=True),
+        "duration": [1.0, np.nan],
+    })
+
+    assert list(utils.to_sql_values(df).itertuples(index=False, name=None)) == [
+        ("2024-09-09 12:56:00+00:00", 1.0),
+        (None, None),
+    ]
+
+
+def test_read_csv_frame_keeps_pinned_columns_as_text(tmp_path):
+    csv = tmp_path / "calls.csv"
+    csv.write_text("Call type,Time,Duration (Sec)\nIncoming,2024-09-09 12:56:00,35\n,,\n")
+
+    df = utils.read_csv_frame(csv, {"Call type": object, "Time": object})
+
+    assert df["Call type"].tolist()[0] == "Incoming"
+    assert df["Call type"].isna().tolist() == [False, True]
+    assert df["Duration (Sec)"].tolist()[0] == 35
+
+
+def test_read_csv_frame_keeps_pinned_timestamps_as_written(tmp_path):
+    csv = tmp_path / "calls.csv"
+    csv.write_text("Time,Duration (Sec)\n2024-09-09 12:56:00,35\n,1\n2024-09-09,2\n")
+
+    df = utils.read_csv_frame(csv, {"Time": object})
+
+    assert df["Time"].tolist()[:1] + df["Time"].tolist()[2:] == ["2024-09-09 12:56:00", "2024-09-09"]
+    assert df["Time"].isna().tolist() == [False, True, False]
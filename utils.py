@@ -1,20 +1,52 @@
+import numpy as np
 import pandas as pd
 import logging
-from typing import Optional, Tuple
+import re
+import warnings
+from datetime import datetime
+from functools import lru_cache
+from importlib.util import find_spec
+from typing import Any, BinaryIO, Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
 from pathlib import Path
+from zoneinfo import ZoneInfo
+from dateutil.parser import parse
+
+try:
+    import polars as pl  # Multi-threaded Rust CSV reader, used for CSV imports when installed
+except ImportError:
+    pl = None
+
+__all__ = [
+    'validate_file_type', 'read_file_sample', 'sanitize_dataframe',
+    'STRING_DTYPE', 'parse_timestamp_flexible', 'parse_timestamp_series', 'coerce_int_series',
+    'header_sets', 'match_headers', 'csv_dtypes', 'read_csv_frame', 'to_sql_values',
+]
+
+# Arrow-backed strings when pyarrow is installed, pandas' own string dtype otherwise
+STRING_DTYPE = 'string[pyarrow]' if find_spec('pyarrow') else 'string'
+
+_NON_ASCII = re.compile(r'[^\x00-\x7f]+')
 
 def validate_file_type(file_path: Path) -> bool:
     """Validate if file type is supported"""
     return file_path.suffix.lower() in ['.csv', '.xlsx', '.xls']
 
-def read_file_sample(file_path: Path, sample_size: int = 5) -> Tuple[Optional[pd.DataFrame], str]:
-    """Read a sample of rows from file for preview"""
+def read_file_sample(file_path: Union[Path, BinaryIO], sample_size: int = 5) -> Tuple[Optional[pd.DataFrame], str]:
+    """Read a sample of rows from a file, or from an upload's in-memory buffer, for preview"""
     try:
-        if file_path.suffix.lower() == '.csv':
+        # Uploads are read where they already sit in memory, so no temp copy has to be written first
+        suffix = Path(file_path if isinstance(file_path, Path) else getattr(file_path, 'name', '')).suffix.lower()
+        if suffix == '.csv':
             df = pd.read_csv(file_path, nrows=sample_size)
             return df, 'csv'
         else:
-            df = pd.read_excel(file_path, nrows=sample_size)
+            # openpyxl streams xlsx sheets read-only and stops after the sample, where calamine
+            # would load the whole sheet first; calamine stays the choice for legacy xls
+            engine = 'openpyxl' if suffix in ('.xlsx', '.xlsm') else 'calamine'
+            try:
+                df = pd.read_excel(file_path, nrows=sample_size, engine=engine)
+            except ImportError:
+                df = pd.read_excel(file_path, nrows=sample_size)
             return df, 'excel'
     except Exception as e:
         logging.error(f"Error reading file sample: {e}")
@@ -26,26 +58,146 @@ def sanitize_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     df = df.dropna(how='all')
     df = df.dropna(axis=1, how='all')
     
+    # Cleaned columns are collected and written back in one assignment instead of one at a time
+    cleaned = {}
+
+    # Group the columns by kind in a single pass over the dtypes
+    string_cols, datetime_cols, numeric_cols = [], [], []
+    for col, dtype in df.dtypes.items():
+        if pd.api.types.is_string_dtype(dtype):
+            # Python objects or Arrow strings
+            string_cols.append(col)
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            # tz-aware ones included
+            datetime_cols.append(col)
+        elif issubclass(getattr(dtype, 'numpy_dtype', dtype).type, (np.float64, np.int64)):
+            # Nullable and Arrow-backed columns are matched on their numpy type, as select_dtypes does
+            numeric_cols.append(col)
+
     # Clean string columns
-    for col in df.select_dtypes(include=['object']).columns:
+    for col in string_cols:
         # Strip whitespace
-        df[col] = df[col].str.strip()
-        # Replace empty strings with NaN
-        df[col] = df[col].replace(r'^\s*$', pd.NA, regex=True)
-        # Remove special characters that might cause JSON issues
-        df[col] = df[col].apply(lambda x: x.encode('ascii', 'ignore').decode('ascii') if isinstance(x, str) else x)
+        values = df[col].str.strip()
+        # Replace empty strings with NaN; after the strip a plain comparison matches what a regex would
+        values = values.mask(values == '', pd.NA)
+        # Remove special characters that might cause JSON issues; Arrow's regex kernel takes the
+        # pattern text, since compiled patterns are not supported there
+        pattern = _NON_ASCII.pattern if isinstance(values.dtype, pd.ArrowDtype) else _NON_ASCII
+        cleaned[col] = values.str.replace(pattern, '', regex=True)
     
     # Handle datetime columns
-    datetime_cols = df.select_dtypes(include=['datetime64']).columns
     for col in datetime_cols:
-        df[col] = pd.to_datetime(df[col], errors='coerce')
+        cleaned[col] = pd.to_datetime(df[col], errors='coerce')
     
     # Handle numeric columns
-    numeric_cols = df.select_dtypes(include=['float64', 'int64']).columns
     for col in numeric_cols:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
+        cleaned[col] = pd.to_numeric(df[col], errors='coerce')
+
+    if cleaned:
+        df[list(cleaned)] = pd.DataFrame(cleaned, index=df.index)
     
-    # Drop rows where all key columns are NA
+    # Drop rows where all key columns are NA; unlike the first dropna this also catches rows
+    # whose only values were blank strings before the cleaning above
     df = df.dropna(subset=df.columns, how='all')
     
     return df
+
+@lru_cache(maxsize=1 << 17)
+def parse_timestamp_flexible(date_str: str, timezone: str = "UTC") -> Optional[datetime]:
+    """Parse a date string into an aware datetime, memoized per string; callers clear the cache after each file"""
+    try:
+        dt = parse(date_str)
+        # ZoneInfo caches one instance per key, and attaching it needs no pytz-style localize step
+        tz = ZoneInfo(timezone)
+        return dt.replace(tzinfo=tz) if dt.tzinfo is None else dt.astimezone(tz)
+    except (ValueError, TypeError) as e:
+        logging.warning(f"Failed to parse timestamp '{date_str}': {e}")
+        return None
+
+def parse_timestamp_series(values: pd.Series, timezone: str = "UTC") -> pd.Series:
+    """Parse a column of date strings in bulk, using dateutil only for values pandas cannot read"""
+    # Columns that are not all strings (e.g. Excel cells already read as datetimes) keep the per-value path
+    if pd.api.types.infer_dtype(values, skipna=True) != "string":
+        return values.apply(lambda x: parse_timestamp_flexible(x, timezone) if pd.notna(x) and isinstance(x, str) else x)
+
+    # C parser with a per-unique-string cache. Naive values are wall times in the target timezone, so
+    # they are localized rather than read as UTC; for UTC itself utc=True covers both in one step
+    try:
+        with warnings.catch_warnings():
+            # pandas warns about (and newer versions reject) differing offsets unless utc=True
+            warnings.simplefilter("error", FutureWarning)
+            parsed = pd.to_datetime(values, errors="coerce", utc=(timezone == "UTC"), format="mixed", cache=True)
+    except (FutureWarning, ValueError):
+        # Differing offsets, or naive next to aware values; each value is localized on its own
+        parsed = pd.to_datetime(values.map(lambda x: parse_timestamp_flexible(x, timezone), na_action="ignore"), utc=True)
+    if parsed.dt.tz is None:
+        # Wall times skipped or repeated by a DST change become NaT here and go through dateutil below
+        parsed = parsed.dt.tz_localize(timezone, ambiguous="NaT", nonexistent="NaT")
+    parsed = parsed.dt.tz_convert(timezone)
+    leftovers = parsed.isna() & values.notna()
+    if leftovers.any():
+        fallback = values[leftovers].map(lambda x: parse_timestamp_flexible(x, timezone))
+        parsed = parsed.fillna(pd.to_datetime(fallback, utc=True).dt.tz_convert(timezone))
+    return parsed
+
+def coerce_int_series(values: pd.Series) -> pd.Series:
+    """Convert a column to integers, with unparseable or missing values as 0"""
+    if values.dtype == object:
+        # Text columns repeat a small set of values, so each distinct string is converted only once
+        codes, uniques = pd.factorize(values.to_numpy())
+        numbers = pd.to_numeric(uniques, errors='coerce')
+        if (codes < 0).any():
+            # Missing cells have code -1, which picks the NaN appended at the end
+            numbers = np.append(numbers.astype(float), np.nan)
+        values = pd.Series(numbers[codes], index=values.index, name=values.name)
+    else:
+        values = pd.to_numeric(values, errors='coerce')
+    return values.fillna(0).astype(int)
+
+def header_sets(table_schemas: Dict[str, Dict[str, Any]]) -> List[Tuple[str, FrozenSet[str], FrozenSet[str]]]:
+    """Build each table's original and renamed header sets once, for the subset checks in match_headers"""
+    return [(name, frozenset(schema["renames"]), frozenset(schema["columns"])) for name, schema in table_schemas.items()]
+
+def match_headers(sets: Iterable[Tuple[str, FrozenSet[str], FrozenSet[str]]], file_headers: FrozenSet[str]) -> Optional[str]:
+    """Return the first table whose original or renamed headers are all present"""
+    for table, rename_keys, columns in sets:
+        if rename_keys <= file_headers or columns <= file_headers:
+            return table
+    return None
+
+def csv_dtypes(columns: pd.Index, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a table's text and timestamp headers to object, so pandas reads them as text without inference"""
+    types = dict(zip(schema["columns"], schema["types"]))
+    # Timestamps stay text for parse_timestamp_series; integers are left to inference for values like "35 Sec"
+    return {col: object for col in columns if types.get(schema["renames"].get(col, col)) in (str, datetime)}
+
+def read_csv_frame(file_path: Path, dtype: Dict[str, Any]) -> pd.DataFrame:
+    """Read a whole CSV with polars when installed, else pandas' pyarrow engine, else its C parser"""
+    if pl is not None:
+        try:
+            # Text columns are pinned to strings as with pandas; the rest are inferred from the whole file
+            return pl.read_csv(
+                file_path, schema_overrides={col: pl.String for col in dtype}, infer_schema_length=None
+            ).to_pandas().fillna(np.nan)
+        except pl.exceptions.PolarsError as e:
+            logging.warning(f"polars could not read {file_path}, falling back to pandas: {e}")
+    try:
+        from pyarrow import csv as pa_csv, string as pa_string
+    except ImportError:
+        return pd.read_csv(file_path, dtype=dtype)
+    # Arrow's reader parses on several threads. Pinned columns are typed before it reads them,
+    # since pandas' dtype= is only applied after Arrow has already inferred timestamps from the text.
+    # Empty text cells come back as None, so they become the NaN the C parser would have produced
+    convert_options = pa_csv.ConvertOptions(
+        column_types={col: pa_string() for col in dtype}, strings_can_be_null=True
+    )
+    return pa_csv.read_csv(file_path, convert_options=convert_options).to_pandas().fillna(np.nan)
+
+def to_sql_values(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert values to types sqlite3 can bind directly, with None for missing values"""
+    # Numpy values become objects and timestamps become the same text to_sql wrote
+    values = df.astype(object)
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            values[col] = df[col].astype(str)
+    return values.where(df.notna(), None)